@@ -1,48 +1,117 @@
+# Imported first, so that the startup profile covers the imports below
+import startup
+
 import json
+import time
 import random
 import asyncio
+import argparse
 
 import pyglet
 from pyglet.window import key
-import aiohttp
 
 from eventloop import CustomEventLoop
-from geometry import Vector
-from gameutil import (
-    CREATURES, FX, UI, Tile, ObjectPool, BloodSprite, Actor, GameResources,
-    BattlePreparingStatus
-)
+
+
+def import_game_modules():
+    """Import the game modules into this module's namespace.
+
+    They pull in NumPy and pyglet.graphics, which the loading screen does not
+    need, so they are imported once the first frame is shown.
+    """
+    global Vector, Rectangle, MapCache, MapLoader, TileGrid, Minimap
+    global UI, TILE_WIDTH, TILE_HEIGHT, ObjectPool, BloodSprite, Actor, GameResources, BattlePreparingStatus
+
+    from geometry import Vector, Rectangle
+    from gameutil import (
+        UI, TILE_WIDTH, TILE_HEIGHT, ObjectPool, BloodSprite, Actor, GameResources,
+        BattlePreparingStatus
+    )
+    from mapcache import MapCache
+    from maploader import MapLoader
+    from tilegrid import TileGrid
+    from minimap import Minimap
 
 
 class MainWindow(pyglet.window.Window):
+    # Redraw rate cap when only frame animations of idle sprites are running
+    ambient_frame_interval = 1 / 15
+    minimap_size = 160
+    minimap_player_color = (255, 215, 0)
+    view = None
+    # Without the event queue, on_resize is dispatched before __init__ is done
+    loaded = False
+    loading_label = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.settings = self.load_settings()
         self.sprites_scale = 2
-        GameResources.load_resources()
+        self.loaded = False
+        self.loading_label = pyglet.text.Label(
+            'Loading...', font_size=12, x=self.width // 2, y=self.height // 2,
+            anchor_x='center', anchor_y='center'
+        )
         self.ws_messages_queue = []
 
         # self.key_handler = key.KeyStateHandler()
         # self.push_handlers(self.key_handler)
-        self.tiles = []
+        self.tiles = None
+        self.map_cache = None
+        self.map_loader = None
+        self.minimap = None
         self.player_name = self.settings['username']
         self.player = None
         self.player_stamina = 0
-        self.battle_preparing = BattlePreparingStatus('', 0, False)
+        self.battle_preparing = None
         self.creatures = {}
         self.ui_label = None
-        self.init_ui()
+        self.ui_label_inputs = None
         self.time = 0
         self.moving_sprites = {}
         self.rotating_sprites = {}
-        self.blood_pool = ObjectPool(self._blood_factory, 10)
+        self.blood_pool = None
         self.map_width = 0
         self.map_height = 0
-        pyglet.clock.schedule_interval(self.update, 1 / 60.0)
+        self.dirty = True
+        self.drawn_at = 0
+        self.updating = False
+
+    async def load(self):
+        """Load the game resources step by step, letting the event loop run in between."""
+        import_game_modules()
+        startup.profile.mark('game modules')
+        await asyncio.sleep(0)
+
+        for step in GameResources.load_steps():
+            startup.profile.mark(step)
+            await asyncio.sleep(0)
+
+        self.initialize()
+        startup.profile.mark('ui')
+
+    def initialize(self):
+        """Set up everything that needs the loaded resources, replacing the loading screen."""
+        import_game_modules()
+        self.battle_preparing = BattlePreparingStatus('', 0, False)
+        self.init_ui()
+        self.blood_pool = ObjectPool(self._blood_factory, 10)
+        self.update_view()
+        self.loading_label.delete()
+        self.loading_label = None
+        self.loaded = True
+        self.invalidate()
+
+    def draw_frame(self):
+        # Called directly, dispatch_event would only queue on_draw until the
+        # event loop is running
+        self.switch_to()
+        self.on_draw()
+        self.flip()
 
     def _blood_factory(self):
-        sprite = BloodSprite(
-            random.choice(GameResources.data['blood']), batch=GameResources.batch, group=FX
+        sprite = GameResources.fx_renderer.create_sprite(
+            random.choice(GameResources.data['blood']), loop=False, sprite_class=BloodSprite
         )
         sprite.color = (170, 0, 0)
         sprite.visible = False
@@ -55,24 +124,76 @@ class MainWindow(pyglet.window.Window):
 
     def coords_to_pixels(self, x, y):
         return (
-            8 * self.sprites_scale + x * 16 * self.sprites_scale,
-            (self.map_height - y) * 24 * self.sprites_scale - 12 * self.sprites_scale
+            TILE_WIDTH // 2 * self.sprites_scale + x * TILE_WIDTH * self.sprites_scale,
+            (self.map_height - y) * TILE_HEIGHT * self.sprites_scale - TILE_HEIGHT // 2 * self.sprites_scale
         )
 
+    def visible_tiles(self):
+        tile_width = TILE_WIDTH * self.sprites_scale
+        tile_height = TILE_HEIGHT * self.sprites_scale
+        return Rectangle(
+            0,
+            max(self.map_height - 1 - (self.height - 1) // tile_height, 0),
+            min((self.width - 1) // tile_width, self.map_width - 1),
+            self.map_height - 1
+        )
+
+    def update_view(self):
+        # Sprites are anchored at their center, so the view is grown by a tile
+        # to keep the ones crossing the window border
+        margin = max(TILE_WIDTH, TILE_HEIGHT) * self.sprites_scale
+        self.view = Rectangle(-margin, -margin, self.width + margin, self.height + margin)
+        GameResources.creature_renderer.set_view(self.view)
+        GameResources.fx_renderer.set_view(self.view)
+
+    def place_minimap(self):
+        self.minimap.set_position(
+            self.width - self.minimap_size - 5, self.height - 25 - self.minimap.sprite.height
+        )
+
+    def update_minimap_actor(self, actor):
+        if self.minimap:
+            color = self.minimap_player_color if actor is self.player else actor.sprite.color
+            self.minimap.move_actor(actor.id, actor.x, actor.y, color)
+
+    def in_view(self, x, y):
+        view = self.view
+        return view.x1 <= x <= view.x2 and view.y1 <= y <= view.y2
+
+    def on_resize(self, width, height):
+        super().on_resize(width, height)
+        # Some platforms resize the window before __init__ is done
+        if self.view is not None:
+            self.update_view()
+            if self.minimap:
+                self.place_minimap()
+            self.invalidate()
+        elif self.loading_label:
+            self.loading_label.x = width // 2
+            self.loading_label.y = height // 2
+
     def init_ui(self):
-        GameResources.batch.add(
+        GameResources.ui_batch.add(
             4, pyglet.gl.GL_QUADS, UI,
             ('v2f', (0, self.height, self.width, self.height, self.width, self.height - 20, 0, self.height - 20)),
             ('c4B', (0, 0, 0, 255, 0, 0, 0, 255, 0, 0, 0, 30, 0, 0, 0, 30))
         )
         self.ui_label = pyglet.text.Label(
             '', font_size=8, anchor_y='top', x=5, y=self.height - 5,
-            batch=GameResources.batch, group=UI
+            batch=GameResources.ui_batch, group=UI
         )
 
     def update_ui_label(self):
         if self.player:
             bps = self.battle_preparing
+            inputs = (
+                self.time, self.player_stamina, bps.active, bps.kind, round(bps.energy, 1),
+                self.player.x, self.player.y
+            )
+            if inputs == self.ui_label_inputs:
+                return
+
+            self.ui_label_inputs = inputs
             if bps.active:
                 bps_label = f' {"A" if bps.kind == "attack" else "D"}: {round(bps.energy, 1)}'
             else:
@@ -83,45 +204,86 @@ class MainWindow(pyglet.window.Window):
                 f'Pos: {self.player.x}, {self.player.y}'
             )
 
+    def invalidate(self):
+        self.dirty = True
+        if isinstance(event_loop := pyglet.app.event_loop, CustomEventLoop):
+            event_loop.wake()
+
+    def redraw_delay(self):
+        """Seconds until the window has to be redrawn, None if nothing is going to change."""
+        if not self.loaded:
+            return 0 if self.dirty else None
+
+        renderers = (GameResources.creature_renderer, GameResources.fx_renderer)
+        textures = tuple(texture for texture in (self.map_cache, self.minimap) if texture)
+        if self.dirty or any(layer.dirty for layer in renderers + textures):
+            return 0
+
+        delays = [delay for delay in (renderer.frame_change_delay() for renderer in renderers) if delay is not None]
+        if not delays:
+            return None
+        return max(min(delays), self.drawn_at + self.ambient_frame_interval - time.perf_counter(), 0)
+
+    def start_updating(self):
+        if not self.updating:
+            self.updating = True
+            pyglet.clock.schedule_interval(self.update, 1 / 60.0)
+
     def on_draw(self):
+        self.dirty = False
+        self.drawn_at = time.perf_counter()
+        if not self.loaded:
+            self.clear()
+            if self.loading_label:
+                self.loading_label.draw()
+            return
+
         self.update_ui_label()
+        if self.map_cache:
+            self.map_cache.update(self.visible_tiles())
+        if self.minimap:
+            self.minimap.update()
 
         pyglet.gl.glEnable(pyglet.gl.GL_BLEND)
         pyglet.gl.glBlendFunc(pyglet.gl.GL_SRC_ALPHA, pyglet.gl.GL_ONE_MINUS_SRC_ALPHA)
 
         self.clear()
         GameResources.batch.draw()
+        GameResources.creature_renderer.draw()
+        GameResources.fx_renderer.draw()
+        GameResources.ui_batch.draw()
+        for texture in (self.map_cache, self.minimap):
+            if texture:
+                texture.dirty = False
 
     def place_on_tile(self, destination_x, destination_y, origin_x=None, origin_y=None):
+        if self.map_cache is None:
+            return
+
         if origin_x is not None and origin_y is not None:
-            origin = self.tiles[origin_y * self.map_width + origin_x]
-            if origin and origin.foreground:
-                origin.foreground.visible = True
+            self.map_cache.show_foreground(origin_x, origin_y)
 
         if destination_x is not None and destination_y is not None:
-            destination = self.tiles[destination_y * self.map_width + destination_x]
-            if destination.foreground:
-                destination.foreground.visible = False
+            self.map_cache.hide_foreground(destination_x, destination_y)
 
     def animate_movement(self, actor, x, y):
         if actor in self.moving_sprites:
             actor.sprite.update(*self.coords_to_pixels(actor.x, actor.y))
         velocity = (Vector(x, y) - Vector(actor.sprite.x, actor.sprite.y)).normalized * 200
         self.moving_sprites[actor] = (x, y, velocity)
+        self.start_updating()
 
     def animate_rotation(self, sprite, angle, speed=5):
         self.rotating_sprites[sprite] = (angle, speed)
+        self.start_updating()
 
     def add_creature(self, data):
         x = data['position']['x']
         y = data['position']['y']
         manifest = GameResources.data['creatures']['manifest'][data['kind']]
         coords = self.coords_to_pixels(x, y)
-        sprite = pyglet.sprite.Sprite(
-            GameResources.data['creatures']['sprites'][manifest['sprite']],
-            x=coords[0],
-            y=coords[1],
-            batch=GameResources.batch, group=CREATURES
+        sprite = GameResources.creature_renderer.create_sprite(
+            GameResources.data['creatures']['sprites'][manifest['sprite']], *coords
         )
         actor = Actor(sprite, data['id'], x, y)
         if self.sprites_scale > 1:
@@ -132,23 +294,39 @@ class MainWindow(pyglet.window.Window):
         if data['kind'] == 'player':
             if data['name'] == self.player_name:
                 self.player = actor
+        self.update_minimap_actor(actor)
 
-    def on_game_initialized_ws_received(self, msg):
+    def on_map_header_ws_received(self, msg):
         self.map_height = height = msg['map']['height']
         self.map_width = width = msg['map']['width']
-        for y in range(height):
-            for x in range(width):
-                tile_type = Tile.Type(msg['map']['tiles'][y * width + x]).name
-                tile = Tile.from_manifest(
-                    random.choice(GameResources.data['tileset']['manifest'][tile_type]),
-                    GameResources.batch, self.sprites_scale
-                )
-                tile.set_position(*self.coords_to_pixels(x, y))
-                self.tiles.append(tile)
+        self.tiles = TileGrid(width, height)
+        if self.map_cache:
+            self.map_cache.delete()
+        self.map_cache = MapCache(self.tiles, GameResources.batch, self.sprites_scale)
+        self.map_loader = MapLoader(self.tiles, msg['map'].get('seed'))
+        if self.minimap:
+            self.minimap.delete()
+        self.minimap = Minimap(self.tiles, GameResources.palette, self.minimap_size, GameResources.ui_batch, UI)
+        self.place_minimap()
 
         for creature in msg['actors']:
             self.add_creature(creature)
 
+    def on_map_chunk_ws_received(self, msg):
+        if self.map_loader is None:
+            return
+
+        self.map_loader.push(msg['x'], msg['y'], msg['width'], msg['height'], msg['tiles'])
+        self.start_updating()
+
+    def on_game_initialized_ws_received(self, msg):
+        # Servers without map streaming send the whole map at once, it is
+        # still turned into tiles chunk by chunk around the player
+        self.on_map_header_ws_received(msg)
+        origin = self.player or Vector(0, 0)
+        self.map_loader.split(msg['map']['tiles'], origin.x, origin.y, self.map_cache.chunk_size)
+        self.start_updating()
+
     def on_player_connected_ws_received(self, msg):
         if msg['player']['id'] in self.creatures:
             return
@@ -173,6 +351,7 @@ class MainWindow(pyglet.window.Window):
         self.animate_movement(actor, *self.coords_to_pixels(x, y))
         actor.x = x
         actor.y = y
+        self.update_minimap_actor(actor)
 
         if self.player and msg['actor']['id'] == self.player.id:
             self.player_stamina = msg['actor']['stamina']
@@ -191,16 +370,23 @@ class MainWindow(pyglet.window.Window):
         if defender is None:
             return
 
-        blood: pyglet.sprite.Sprite = self.blood_pool.retrieve()
-        blood.update(defender.sprite.x, defender.sprite.y)
-        blood._frame_index = 0
-        blood._pool = self.blood_pool
-        blood.visible = True
+        # Nobody would see blood spilled outside of the window
+        if self.in_view(defender.sprite.x, defender.sprite.y):
+            blood: BloodSprite = self.blood_pool.retrieve()
+            blood.update(defender.sprite.x, defender.sprite.y)
+            blood.restart()
+            blood._pool = self.blood_pool
+            blood.visible = True
+            self.start_updating()
 
         if not msg['defender_alive']:
-            defender.hide()
+            defender.delete()
             del self.creatures[msg['defender']['id']]
+            self.moving_sprites.pop(defender, None)
+            self.rotating_sprites.pop(defender, None)
             self.place_on_tile(None, None, defender.x, defender.y)
+            if self.minimap:
+                self.minimap.remove_actor(defender.id)
 
     def on_prepare_to_battle_ws_received(self, msg):
         actor = self.creatures.get(msg['actor']['id'])
@@ -232,6 +418,7 @@ class MainWindow(pyglet.window.Window):
 
     def send_ws(self, data):
         self.ws_messages_queue.append(data)
+        self.invalidate()
 
     def update_creature(self, creature, data):
         if (exhausted := data['exhausted']) != creature.exhausted:
@@ -241,15 +428,25 @@ class MainWindow(pyglet.window.Window):
             creature.prepare_to_battle(None)
 
     def update(self, dt):
+        GameResources.fx_renderer.update()
+
+        if self.map_loader and self.map_loader.pending:
+            for rect in self.map_loader.process():
+                self.map_cache.invalidate(rect)
+                self.minimap.refresh(rect)
+
         bps = self.battle_preparing
         if bps.active:
             bps.energy += 6 * dt
+            self.dirty = True
 
+        # Animations outside of the window snap to their final state
         completed_move = []
         for actor, (x, y, velocity) in self.moving_sprites.items():
             current_pos = Vector(actor.sprite.x, actor.sprite.y)
             destination = Vector(x, y)
-            if (destination - current_pos).magnitude_squared < 0.1:
+            on_screen = self.in_view(current_pos.x, current_pos.y) or self.in_view(x, y)
+            if not on_screen or (destination - current_pos).magnitude_squared < 0.1:
                 actor.sprite.update(*self.coords_to_pixels(actor.x, actor.y))
                 completed_move.append(actor)
             else:
@@ -258,7 +455,7 @@ class MainWindow(pyglet.window.Window):
 
         completed_rotation = []
         for actor, (angle, speed) in self.rotating_sprites.items():
-            if abs(actor.sprite.rotation - angle) < 1:
+            if not self.in_view(actor.sprite.x, actor.sprite.y) or abs(actor.sprite.rotation - angle) < 1:
                 actor.sprite.update(rotation=angle)
                 completed_rotation.append(actor)
             else:
@@ -269,7 +466,16 @@ class MainWindow(pyglet.window.Window):
         for sprite in completed_rotation:
             del self.rotating_sprites[sprite]
 
+        animating = self.moving_sprites or self.rotating_sprites or GameResources.fx_renderer.count
+        loading = self.map_loader and self.map_loader.pending
+        if not (animating or bps.active or loading):
+            pyglet.clock.unschedule(self.update)
+            self.updating = False
+
     def on_key_press(self, symbol, modifiers):
+        if not self.loaded:
+            return
+
         if symbol == key.LEFT:
             self.send_ws({'action': 'move', 'direction': 'left'})
         elif symbol == key.UP:
@@ -283,8 +489,12 @@ class MainWindow(pyglet.window.Window):
             bps.active = True
             bps.energy = 0
             bps.kind = 'attack' if symbol == key.A else 'defence'
+            self.start_updating()
 
     def on_key_release(self, symbol, modifiers):
+        if not self.loaded:
+            return
+
         if symbol == key.A or symbol == key.D:
             bps = self.battle_preparing
             if bps.active:
@@ -292,39 +502,90 @@ class MainWindow(pyglet.window.Window):
                 self.send_ws({'action': 'prepare_to_battle', 'type': bps.kind, 'energy': int(bps.energy)})
 
 
-async def receive_ws_messages(ws, window):
+async def receive_ws_messages(ws, window, record=None):
+    # Already imported by main() when the connection is opened
+    from aiohttp import WSMsgType
+
     async for msg in ws:
+        if msg.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+            continue
+
         try:
             data = json.loads(msg.data)
-        except json.JSONDecodeError:
+        except ValueError:
             print('Invalid JSON')
             continue
 
+        if record is not None:
+            # Re-encoded, binary frames are recorded as text lines too
+            record.write(json.dumps(data) + '\n')
+
         if 'type' not in data:
             continue
 
         handler = getattr(window, f'on_{data["type"]}_ws_received', None)
         if handler:
             handler(data)
+            window.invalidate()
 
 
-async def main():
+async def main(record=None):
     pyglet.app.event_loop = event_loop = CustomEventLoop()
     window = MainWindow(caption='Endless Compact Daemon Hunt', width=960, height=720)
-
     event_loop.main_window = window
+    startup.profile.mark('window')
 
-    async with aiohttp.ClientSession() as session:
-        async with session.ws_connect(window.settings['server']) as ws:
-            event_loop.websocket_client = ws
-            await asyncio.gather(event_loop.run(), receive_ws_messages(ws, window))
+    window.draw_frame()
+    startup.profile.mark('first frame')
 
+    # aiohttp takes a while to import, the loading screen is already shown by now
+    import aiohttp
+    startup.profile.mark('aiohttp import')
 
-if __name__ == '__main__':
+    async with aiohttp.ClientSession() as session:
+        # The window keeps handling events and the connection is established
+        # while the resources are loading
+        running = asyncio.ensure_future(event_loop.run())
+        connecting = asyncio.ensure_future(session.ws_connect(window.settings['server']))
+        try:
+            await window.load()
+            ws = await connecting
+            startup.profile.mark('websocket connected')
+        except BaseException:
+            connecting.cancel()
+            running.cancel()
+            raise
+        finally:
+            startup.profile.report()
+
+        async with ws:
+            await event_loop.connect(ws)
+            await asyncio.gather(running, receive_ws_messages(ws, window, record))
+
+
+def setup_resources():
     pyglet.image.Texture.default_min_filter = pyglet.gl.GL_NEAREST
     pyglet.image.Texture.default_mag_filter = pyglet.gl.GL_NEAREST
 
     pyglet.resource.path = ['resources']
     pyglet.resource.reindex()
 
-    asyncio.run(main())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', metavar='PATH', help='write received messages to a JSON lines file')
+    parser.add_argument(
+        '--profile-startup', action='store_true', help='print the time taken by each startup phase'
+    )
+    args = parser.parse_args()
+
+    startup.profile.enabled = args.profile_startup
+    startup.profile.mark('imports')
+    setup_resources()
+    startup.profile.mark('resource index')
+
+    if args.record:
+        with open(args.record, 'wt') as record_file:
+            asyncio.run(main(record_file))
+    else:
+        asyncio.run(main())
@@ -4,6 +4,11 @@ import pyglet
 
 
 class CustomEventLoop(pyglet.app.EventLoop):
+    input_poll_interval = 1 / 30
+    websocket_client = None
+    _wakeup = None
+    _input_devices = ()
+
     async def run(self):
         """Begin processing events, scheduled functions and window updates.
 
@@ -19,18 +24,48 @@ class CustomEventLoop(pyglet.app.EventLoop):
         platform_event_loop.start()
         self.dispatch_event('on_enter')
 
-        await self.websocket_client.send_json(
-            {'action': 'connect', 'username': self.main_window.settings['username']}
-        )
+        loop = asyncio.get_running_loop()
+        self._watch_input_devices(loop)
 
         self.is_running = True
         await self._run()
 
         self.is_running = False
+        self._unwatch_input_devices(loop)
         self.dispatch_event('on_exit')
         platform_event_loop.stop()
         raise asyncio.CancelledError
 
+    async def connect(self, websocket_client):
+        """Join the game once the websocket is open, the loop may already be running."""
+        self.websocket_client = websocket_client
+        await websocket_client.send_json(
+            {'action': 'connect', 'username': self.main_window.settings['username'], 'stream_map': True}
+        )
+        self.wake()
+
+    @staticmethod
+    def _selectable_devices(platform_event_loop):
+        # pyglet 1.4 keeps the Xlib devices in the private _select_devices,
+        # the public name is preferred in case a later version exposes it
+        devices = getattr(platform_event_loop, 'select_devices', None)
+        if devices is None:
+            devices = getattr(platform_event_loop, '_select_devices', ())
+        return list(devices)
+
+    def _watch_input_devices(self, loop):
+        # Platforms with selectable input devices (Xlib) can wake the loop up
+        # themselves, the others have to be polled
+        self._wakeup = asyncio.Event()
+        self._input_devices = self._selectable_devices(pyglet.app.platform_event_loop)
+        for device in self._input_devices:
+            loop.add_reader(device.fileno(), self.wake)
+
+    def _unwatch_input_devices(self, loop):
+        for device in self._input_devices:
+            loop.remove_reader(device.fileno())
+        self._input_devices = ()
+
     async def _run(self):
         """The simplest standard run loop, using constant timeout.  Suitable
         for well-behaving platforms (Mac, Linux and some Windows).
@@ -52,10 +87,11 @@ class CustomEventLoop(pyglet.app.EventLoop):
         For example, return ``1.0`` to have the idle method called every
         second, or immediately after any user events.
 
-        The default implementation dispatches the
-        :py:meth:`pyglet.window.Window.on_draw` event for all windows and uses
-        :py:func:`pyglet.clock.tick` and :py:func:`pyglet.clock.get_sleep_time`
-        on the default clock to determine the return value.
+        This implementation dispatches the
+        :py:meth:`pyglet.window.Window.on_draw` event only when the main window
+        has something new to show, then waits until the next scheduled
+        function or animation frame, unless input or a websocket message
+        arrives first.
 
         This method should be overridden by advanced users only.  To have
         code execute at regular intervals, use the
@@ -66,23 +102,40 @@ class CustomEventLoop(pyglet.app.EventLoop):
             be called again, or `None` to block for user input.
         """
         dt = self.clock.update_time()
-        redraw_all = self.clock.call_scheduled_functions(dt)
+        self.clock.call_scheduled_functions(dt)
 
-        # Redraw all windows
+        # Redraw only when something visible has changed
         window = self.main_window
-        if redraw_all or (window._legacy_invalid and window.invalid):
+        if window.redraw_delay() == 0 or (window._legacy_invalid and window.invalid):
             window.switch_to()
             window.dispatch_event('on_draw')
             window.flip()
             window._legacy_invalid = False
 
-        while window.ws_messages_queue:
+        while window.ws_messages_queue and self.websocket_client:
             message = window.ws_messages_queue.pop()
             await self.websocket_client.send_json(message)
 
-        # Update timout
-        sleep_time = self.clock.get_sleep_time(True)
-        if not sleep_time:
-            sleep_time = 1.0/60
-        await asyncio.sleep(sleep_time)
+        # Sleep until the next scheduled function or animation frame, input
+        # events and websocket messages wake the loop up earlier
+        timeouts = [
+            timeout for timeout in (self.clock.get_sleep_time(True), window.redraw_delay())
+            if timeout is not None
+        ]
+        if not self._input_devices:
+            timeouts.append(self.input_poll_interval)
+        if not any(device.poll() for device in self._input_devices):
+            await self._wait(min(timeouts, default=None))
         return 0
+
+    async def _wait(self, timeout):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def wake(self):
+        """Interrupt the idle wait, safe to call before the loop is running."""
+        if self._wakeup is not None:
+            self._wakeup.set()
@@ -1,35 +1,20 @@
-import colorsys
 import random
 import time
 from dataclasses import dataclass
 from enum import IntEnum, auto
 
-import yaml
 import pyglet
 
-_color_max_values = {'h': 360.0, 's': 100.0, 'v': 100.0}
+from instancing import InstancedSprite, InstancedSpriteRenderer
+from palette import Palette
+
+TILE_WIDTH = 16
+TILE_HEIGHT = 24
 BACKGROUND = pyglet.graphics.OrderedGroup(0)
 FOREGROUND = pyglet.graphics.OrderedGroup(1)
-CREATURES = pyglet.graphics.OrderedGroup(2)
-FX = pyglet.graphics.OrderedGroup(3)
 UI = pyglet.graphics.OrderedGroup(4)
 
 
-def color_from_manifest(manifest):
-    hsv = {'h': 0, 's': 0, 'v': 1}
-    for key in 'hsv':
-        if key not in manifest:
-            continue
-
-        value = manifest[key]
-        if isinstance(value, list):
-            value = random.randint(*value)
-        hsv[key] = value / _color_max_values[key]
-
-    converted = colorsys.hsv_to_rgb(**hsv)
-    return tuple(int(channel * 255) for channel in converted)
-
-
 class Tile:
     class Type(IntEnum):
         grass = auto()
@@ -43,52 +28,24 @@ class Tile:
         bush = auto()
         road = auto()
 
-    def __init__(self):
-        self.background: pyglet.sprite.Sprite = None
-        self.foreground: pyglet.sprite.Sprite = None
+    @dataclass
+    class Layer:
+        image: pyglet.image.AbstractImage
+        color_index: int
 
-    @classmethod
-    def from_manifest(cls, manifest, batch=None, scale=1):
-        background_coords = None
-        if 'background' in manifest:
-            background_coords = manifest['background']
-        elif 'backgrounds' in manifest:
-            background_coords = random.choice(manifest['backgrounds'])
-        if background_coords:
-            image = GameResources.data['tileset']['background'][background_coords[1], background_coords[0]]
-            background_sprite = pyglet.sprite.Sprite(image, batch=batch, group=BACKGROUND)
+        def create_sprite(self, x, y, batch=None, group=None, scale=1):
+            sprite = pyglet.sprite.Sprite(self.image, x, y, batch=batch, group=group)
             if scale > 1:
-                background_sprite.scale = scale
-            if (color := manifest.get('color')) and (background_color := color.get('background')):
-                background_sprite.color = color_from_manifest(background_color)
-        else:
-            background_sprite = None
-
-        foreground_coords = None
-        if 'foreground' in manifest:
-            foreground_coords = manifest['foreground']
-        elif 'foregrounds' in manifest:
-            foreground_coords = random.choice(manifest['foregrounds'])
-        if foreground_coords:
-            image = GameResources.data['tileset']['foreground'][foreground_coords[1], foreground_coords[0]]
-            foreground_sprite = pyglet.sprite.Sprite(image, batch=batch, group=FOREGROUND)
-            if scale > 1:
-                foreground_sprite.scale = scale
-            if (color := manifest.get('color')) and (foreground_color := color.get('foreground')):
-                foreground_sprite.color = color_from_manifest(foreground_color)
-        else:
-            foreground_sprite = None
+                sprite.scale = scale
+            sprite.color = GameResources.palette[self.color_index]
+            return sprite
 
-        tile = Tile()
-        tile.background = background_sprite
-        tile.foreground = foreground_sprite
-        return tile
-
-    def set_position(self, x, y):
-        if self.background:
-            self.background.update(x, y)
-        if self.foreground:
-            self.foreground.update(x, y)
+    @staticmethod
+    def layer_coords(manifest, layer):
+        """Tileset coordinates of the layer variants, None entries stand for no image."""
+        if layer in manifest:
+            return [manifest[layer]]
+        return manifest.get(f'{layer}s', [])
 
 
 class ObjectPool:
@@ -129,7 +86,7 @@ class ObjectPool:
                 return
 
 
-class BloodSprite(pyglet.sprite.Sprite):
+class BloodSprite(InstancedSprite):
     def on_animation_end(self):
         if self.visible:
             self.visible = False
@@ -165,7 +122,7 @@ class Actor:
         image = GameResources.data['icons']['attack-prepared' if prepare_type == 'attack' else 'defence-prepared']
         if self.battle_status is None:
             self.battle_status = pyglet.sprite.Sprite(
-                image, self.sprite.x, self.sprite.y - 6 * 2, batch=GameResources.batch, group=UI
+                image, self.sprite.x, self.sprite.y - 6 * 2, batch=GameResources.ui_batch, group=UI
             )
         else:
             self.battle_status.image = image
@@ -181,22 +138,37 @@ class Actor:
 
         self.battle_status.color = color
 
-    def hide(self):
-        self.sprite.visible = False
+    def delete(self):
+        self.sprite.delete()
         if self.battle_status is not None:
-            self.battle_status.visible = False
+            self.battle_status.delete()
+            self.battle_status = None
 
 
 class GameResources:
     data = None
     batch = None
+    ui_batch = None
+    palette = None
+    creature_renderer = None
+    fx_renderer = None
 
     @classmethod
     def load_resources(cls):
+        for _ in cls.load_steps():
+            pass
+
+    @classmethod
+    def load_steps(cls):
+        """Load the resources one step at a time, yielding the name of each finished step.
+
+        Lets the caller keep a loading screen responsive and measure each step.
+        """
         if cls.data is not None:
             return
 
         cls.batch = pyglet.graphics.Batch()
+        cls.ui_batch = pyglet.graphics.Batch()
 
         creatures_image = pyglet.resource.image('Monsters.png')
         creatures_grid = pyglet.image.ImageGrid(creatures_image, columns=19, rows=26)
@@ -212,6 +184,7 @@ class GameResources:
                     0.2 + 0.2 * random.random()
                 )
                 creatures.append(creature)
+        yield 'creature sprites'
 
         creatures_manifest = {
             'player': {
@@ -236,12 +209,20 @@ class GameResources:
             image.anchor_x = image.width // 2
             image.anchor_y = image.height // 2
 
+        yield 'terrain sprites'
+
+        # yaml is only needed here and is slow to import, so it is kept
+        # off the path to the first frame
+        import yaml
+
         with pyglet.resource.file('tileset.yml') as file:
             tileset = list(yaml.load_all(file, yaml.FullLoader))
 
         grouped_tileset = {}
         for tile in tileset:
             grouped_tileset.setdefault(tile['tile'], []).append(cls.process_tile_manifest(tile))
+        cls.palette = Palette.from_tileset(grouped_tileset)
+        yield 'tileset'
 
         blood_image = pyglet.resource.image('FX_Blood.png')
         blood_grid = pyglet.image.ImageGrid(blood_image, columns=14, rows=1)
@@ -272,6 +253,11 @@ class GameResources:
         arrow_image.anchor_x = arrow_image.width // 2
         arrow_image.anchor_y = arrow_image.height // 2
 
+        yield 'effects and icons'
+
+        cls.creature_renderer = InstancedSpriteRenderer(creatures)
+        cls.fx_renderer = InstancedSpriteRenderer(blood_animations)
+
         cls.data = {
             'blood': blood_animations,
             'creatures': {
@@ -292,6 +278,7 @@ class GameResources:
                 'arrow': arrow_image
             }
         }
+        yield 'renderers'
 
     @staticmethod
     def process_tile_manifest(manifest):
@@ -2,6 +2,22 @@ import math
 import random
 
 
+class _LazyNumPy:
+    """Imports NumPy on first use, only the array classes below need it.
+
+    Vector and Rectangle are used on the way to the first frame, where
+    importing NumPy would cost more than everything else in this module.
+    """
+
+    def __getattr__(self, name):
+        global np
+        import numpy as np
+        return getattr(np, name)
+
+
+np = _LazyNumPy()
+
+
 class Vector:
     __slots__ = ('x', 'y')
 
@@ -172,3 +188,270 @@ class Rectangle:
         result.x = int(result.x)
         result.y = int(result.y)
         return result
+
+
+# Same order as Vector.neighbours
+_NEIGHBOUR_OFFSETS = ((0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1))
+
+
+class VectorArray:
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = np.asarray(data).reshape(-1, 2)
+
+    def __str__(self):
+        return f'VectorArray({self.data.tolist()})'
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            x, y = self.data[item].tolist()
+            return Vector(x, y)
+        return VectorArray(self.data[item])
+
+    def __iter__(self):
+        for x, y in self.data.tolist():
+            yield Vector(x, y)
+
+    @staticmethod
+    def _operand(other):
+        """Broadcastable array for an operand.
+
+        Scalars apply to every component, a Vector or any length-2 sequence to
+        every row like Vector arithmetic does, and an (N, 1) or (N, 2) array
+        row by row. Other 1-D shapes are ambiguous and rejected.
+        """
+        if isinstance(other, VectorArray):
+            return other.data
+        if isinstance(other, Vector):
+            return np.array((other.x, other.y))
+        other = np.asarray(other)
+        if other.ndim == 1 and other.shape != (2,):
+            raise ValueError(
+                f'Cannot combine a 1-D operand of shape {other.shape} with vectors, '
+                f'use shape (N, 1) for one scalar per vector'
+            )
+        return other
+
+    # The in-place operators rebind data instead of writing into it, so that
+    # integer arrays can be divided or scaled by floats like Vector can
+
+    def __add__(self, other):
+        return VectorArray(self.data + self._operand(other))
+
+    def __iadd__(self, other):
+        self.data = self.data + self._operand(other)
+        return self
+
+    def __sub__(self, other):
+        return VectorArray(self.data - self._operand(other))
+
+    def __isub__(self, other):
+        self.data = self.data - self._operand(other)
+        return self
+
+    def __mul__(self, other):
+        return VectorArray(self.data * self._operand(other))
+
+    def __imul__(self, other):
+        self.data = self.data * self._operand(other)
+        return self
+
+    def __truediv__(self, other):
+        return VectorArray(self.data / self._operand(other))
+
+    def __itruediv__(self, other):
+        self.data = self.data / self._operand(other)
+        return self
+
+    def __eq__(self, other):
+        return np.all(self.data == self._operand(other), axis=1)
+
+    @property
+    def x(self):
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        return self.data[:, 1]
+
+    @property
+    def magnitude(self):
+        return np.sqrt(self.magnitude_squared)
+
+    @property
+    def magnitude_squared(self):
+        return np.einsum('ij,ij->i', self.data, self.data)
+
+    @property
+    def normalized(self):
+        # Zero-length vectors stay zero instead of turning into NaNs
+        m = self.magnitude[:, np.newaxis]
+        return VectorArray(np.divide(self.data, m, out=np.zeros(self.data.shape), where=m != 0))
+
+    @classmethod
+    def copy(cls, other):
+        return cls(other.data.copy())
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        return cls(np.array([(vector.x, vector.y) for vector in vectors]).reshape(-1, 2))
+
+    @classmethod
+    def grid(cls, width, height):
+        ys, xs = np.divmod(np.arange(width * height), width)
+        return cls(np.stack((xs, ys), axis=1))
+
+    @property
+    def neighbours(self):
+        # Same order as Vector.neighbours, eight rows per vector
+        return VectorArray((self.data[:, np.newaxis, :] + np.array(_NEIGHBOUR_OFFSETS)).reshape(-1, 2))
+
+    def neighbour_indices(self, width, height):
+        """Row-major indices of the eight neighbours of every vector on a width x height grid.
+
+        Returns an array of shape (len(self), 8); neighbours outside the grid are -1.
+        """
+        coords = self.data[:, np.newaxis, :].astype(np.int64) + np.array(_NEIGHBOUR_OFFSETS)
+        xs = coords[..., 0]
+        ys = coords[..., 1]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        return np.where(inside, ys * width + xs, -1)
+
+
+class RectangleArray:
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = np.asarray(data).reshape(-1, 4)
+
+    def __str__(self):
+        return f'RectangleArray({self.data.tolist()})'
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return Rectangle(*self.data[item].tolist())
+        return RectangleArray(self.data[item])
+
+    def __iter__(self):
+        for row in self.data.tolist():
+            yield Rectangle(*row)
+
+    @classmethod
+    def from_rectangles(cls, rectangles):
+        return cls(np.array([(r.x1, r.y1, r.x2, r.y2) for r in rectangles]).reshape(-1, 4))
+
+    @staticmethod
+    def _operand(other):
+        if isinstance(other, RectangleArray):
+            return other.data
+        if isinstance(other, Rectangle):
+            return np.array(((other.x1, other.y1, other.x2, other.y2),))
+        return np.asarray(other).reshape(-1, 4)
+
+    @property
+    def x1(self):
+        return self.data[:, 0]
+
+    @property
+    def y1(self):
+        return self.data[:, 1]
+
+    @property
+    def x2(self):
+        return self.data[:, 2]
+
+    @property
+    def y2(self):
+        return self.data[:, 3]
+
+    @property
+    def width(self):
+        return self.x2 - self.x1
+
+    @property
+    def height(self):
+        return self.y2 - self.y1
+
+    def _bounds(self, other):
+        other = self._operand(other)
+        left = np.maximum(self.data[:, 0], other[:, 0])
+        right = np.minimum(self.data[:, 2], other[:, 2])
+        top = np.maximum(self.data[:, 1], other[:, 1])
+        bottom = np.minimum(self.data[:, 3], other[:, 3])
+        return left, top, right, bottom
+
+    def overlaps(self, other):
+        """Element-wise Rectangle.overlaps against a Rectangle or an array of the same length."""
+        left, top, right, bottom = self._bounds(other)
+        return (left <= right) & (top <= bottom)
+
+    def overlap_matrix(self, other):
+        """Boolean matrix of shape (len(self), len(other)) telling which pairs overlap."""
+        other = self._operand(other)
+        left = np.maximum(self.data[:, np.newaxis, 0], other[np.newaxis, :, 0])
+        right = np.minimum(self.data[:, np.newaxis, 2], other[np.newaxis, :, 2])
+        top = np.maximum(self.data[:, np.newaxis, 1], other[np.newaxis, :, 1])
+        bottom = np.minimum(self.data[:, np.newaxis, 3], other[np.newaxis, :, 3])
+        return (left <= right) & (top <= bottom)
+
+    def intersection(self, other):
+        """Element-wise Rectangle.intersection.
+
+        Rows that do not overlap come out inverted (x1 > x2 or y1 > y2), use overlaps()
+        to filter them.
+        """
+        return RectangleArray(np.stack(self._bounds(other), axis=1))
+
+    def perimeters(self):
+        """All perimeter points in Rectangle.__iter__ order.
+
+        Returns the concatenated points and the number of points of each rectangle.
+        """
+        width = self.width
+        height = self.height
+        counts = 2 * (width + height)
+        starts = np.cumsum(counts) - counts
+        index = np.repeat(np.arange(len(self)), counts)
+        t = np.arange(counts.sum()) - starts[index]
+
+        x1, y1, x2, y2 = (self.data[index, column] for column in range(4))
+        w = width[index]
+        h = height[index]
+
+        xs = np.select(
+            (t < w, t < w + h, t < 2 * w + h),
+            (x1 + t, x2, x2 - (t - w - h)),
+            x1
+        )
+        ys = np.select(
+            (t < w, t < w + h, t < 2 * w + h),
+            (y1, y1 + t - w, y2),
+            y2 - (t - 2 * w - h)
+        )
+        return VectorArray(np.stack((xs, ys), axis=1)), counts
+
+    def random_points(self, padding=0, rng=None):
+        """One Rectangle.random_point per rectangle."""
+        rng = rng or np.random.default_rng()
+        count = len(self)
+        side = rng.integers(1, 5, size=count)
+        horizontal = (side == 1) | (side == 3)
+        length = np.where(horizontal, self.width, self.height)
+        offset = padding + rng.integers(0, length - padding * 2 + 1)
+
+        xs = np.select((side == 1, side == 2, side == 3), (self.x1 + offset, self.x2, self.x1 + offset), self.x1)
+        ys = np.select((side == 1, side == 2, side == 3), (self.y1, self.y1 + offset, self.y2), self.y1 + offset)
+        return VectorArray(np.stack((xs, ys), axis=1).astype(int))
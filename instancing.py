@@ -0,0 +1,441 @@
+import ctypes
+import time
+
+import numpy as np
+import pyglet
+from pyglet import gl
+
+_VERTEX_SHADER = '''
+#version 130
+
+in vec2 corner;
+in vec4 transform;
+in vec4 color;
+in vec4 animation;
+in float loop;
+
+uniform sampler2D frames;
+uniform float time;
+
+out vec2 tex_coord;
+out vec4 tint;
+
+void main() {
+    float index = 0.0;
+    if (animation.z > 0.0) {
+        index = floor(max(time - animation.w, 0.0) / animation.z);
+        index = loop > 0.5 ? mod(index, animation.y) : min(index, animation.y - 1.0);
+    }
+    int frame = int(animation.x + index);
+    vec4 uv = texelFetch(frames, ivec2(frame, 0), 0);
+    vec4 size = texelFetch(frames, ivec2(frame, 1), 0);
+
+    vec2 local = (corner * size.xy - size.zw) * transform.w;
+    float angle = radians(-transform.z);
+    vec2 rotated = vec2(
+        local.x * cos(angle) - local.y * sin(angle),
+        local.x * sin(angle) + local.y * cos(angle)
+    );
+    gl_Position = gl_ModelViewProjectionMatrix * vec4(transform.xy + rotated, 0.0, 1.0);
+    tex_coord = mix(uv.xy, uv.zw, corner);
+    tint = color;
+}
+'''
+
+_FRAGMENT_SHADER = '''
+#version 130
+
+in vec2 tex_coord;
+in vec4 tint;
+
+uniform sampler2D atlas;
+
+void main() {
+    gl_FragColor = texture(atlas, tex_coord) * tint;
+}
+'''
+
+# Per-instance columns: x, y, rotation, scale, r, g, b, a,
+# first frame, frame count, frame duration, start time, loop
+_COLUMNS = 13
+_ATTRIBUTES = (
+    ('transform', 4, 0),
+    ('color', 4, 4),
+    ('animation', 4, 8),
+    ('loop', 1, 12),
+)
+
+
+def _compile_shader(kind, source):
+    shader = gl.glCreateShader(kind)
+    source = source.encode()
+    pointer = ctypes.cast(ctypes.c_char_p(source), ctypes.POINTER(gl.GLchar))
+    length = gl.GLint(len(source))
+    gl.glShaderSource(shader, 1, ctypes.byref(pointer), ctypes.byref(length))
+    gl.glCompileShader(shader)
+
+    status = gl.GLint()
+    gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS, ctypes.byref(status))
+    if not status.value:
+        log_length = gl.GLint()
+        gl.glGetShaderiv(shader, gl.GL_INFO_LOG_LENGTH, ctypes.byref(log_length))
+        log = ctypes.create_string_buffer(max(log_length.value, 1))
+        gl.glGetShaderInfoLog(shader, log_length, None, log)
+        raise RuntimeError(f'Shader compilation failed: {log.value.decode()}')
+
+    return shader
+
+
+def _link_program(*shaders, attributes=()):
+    program = gl.glCreateProgram()
+    for shader in shaders:
+        gl.glAttachShader(program, shader)
+    for location, name in enumerate(attributes):
+        gl.glBindAttribLocation(program, location, ctypes.create_string_buffer(name.encode()))
+    gl.glLinkProgram(program)
+
+    status = gl.GLint()
+    gl.glGetProgramiv(program, gl.GL_LINK_STATUS, ctypes.byref(status))
+    if not status.value:
+        log_length = gl.GLint()
+        gl.glGetProgramiv(program, gl.GL_INFO_LOG_LENGTH, ctypes.byref(log_length))
+        log = ctypes.create_string_buffer(max(log_length.value, 1))
+        gl.glGetProgramInfoLog(program, log_length, None, log)
+        raise RuntimeError(f'Shader program linking failed: {log.value.decode()}')
+
+    for shader in shaders:
+        gl.glDetachShader(program, shader)
+        gl.glDeleteShader(shader)
+
+    return program
+
+
+class InstancedSprite:
+    """Sprite-like handle to one instance of an InstancedSpriteRenderer.
+
+    Mirrors the parts of pyglet.sprite.Sprite the client uses. Hidden sprites
+    are taken out of the instance buffer, so they cost nothing to draw.
+    """
+
+    def __init__(self, renderer, image, x=0, y=0, loop=True):
+        self._renderer = renderer
+        self._state = [x, y, 0, 1, 1, 1, 1, 1, 0, 1, 0, renderer.time, 1 if loop else 0]
+        self._slot = None
+        self._image = None
+        self.image = image
+        self.visible = True
+
+    def _set(self, column, value):
+        self._state[column] = value
+        if self._slot is not None:
+            self._renderer.instances[self._slot, column] = value
+            self._renderer.dirty = True
+
+    @property
+    def image(self):
+        return self._image
+
+    @image.setter
+    def image(self, image):
+        first, count, duration = self._renderer.frames_of(image)
+        self._image = image
+        self._set(8, first)
+        self._set(9, count)
+        self._set(10, duration)
+
+    @property
+    def x(self):
+        return self._state[0]
+
+    @x.setter
+    def x(self, x):
+        self._set(0, x)
+
+    @property
+    def y(self):
+        return self._state[1]
+
+    @y.setter
+    def y(self, y):
+        self._set(1, y)
+
+    @property
+    def rotation(self):
+        return self._state[2]
+
+    @rotation.setter
+    def rotation(self, rotation):
+        self._set(2, rotation)
+
+    @property
+    def scale(self):
+        return self._state[3]
+
+    @scale.setter
+    def scale(self, scale):
+        self._set(3, scale)
+
+    @property
+    def color(self):
+        return tuple(int(channel * 255) for channel in self._state[4:7])
+
+    @color.setter
+    def color(self, rgb):
+        for column, channel in enumerate(rgb, 4):
+            self._set(column, channel / 255)
+
+    @property
+    def opacity(self):
+        return int(self._state[7] * 255)
+
+    @opacity.setter
+    def opacity(self, opacity):
+        self._set(7, opacity / 255)
+
+    @property
+    def visible(self):
+        return self._slot is not None
+
+    @visible.setter
+    def visible(self, visible):
+        if visible and self._slot is None:
+            self._renderer.add(self)
+        elif not visible and self._slot is not None:
+            self._renderer.remove(self)
+
+    def update(self, x=None, y=None, rotation=None, scale=None):
+        if x is not None:
+            self._set(0, x)
+        if y is not None:
+            self._set(1, y)
+        if rotation is not None:
+            self._set(2, rotation)
+        if scale is not None:
+            self._set(3, scale)
+
+    def restart(self):
+        self._set(11, self._renderer.time)
+        if self._state[12] < 0:
+            self._set(12, 0)
+
+    def delete(self):
+        self.visible = False
+        self._renderer = None
+
+    def on_animation_end(self):
+        pass
+
+
+class InstancedSpriteRenderer:
+    """Draws every sprite of one texture with a single instanced draw call.
+
+    Position, rotation, scale, color and animation of each sprite live in one
+    per-instance vertex buffer, which is re-uploaded only when something
+    changed. Animation frames are advanced in the vertex shader from a frame
+    table texture, so idle animations need no CPU work at all.
+
+    All frames of the registered animations must be regions of the same
+    texture. Needs OpenGL 3.3 (GLSL 1.30, instanced arrays, float textures),
+    which Mesa's llvmpipe provides, so it runs on GPU-less machines with
+    ``LIBGL_ALWAYS_SOFTWARE=1``.
+    """
+
+    def __init__(self, images, capacity=64, clock=time.perf_counter):
+        self.clock = clock
+        self.epoch = clock()
+        self.instances = np.zeros((capacity, _COLUMNS), dtype=np.float32)
+        self.count = 0
+        self.sprites = []
+        self.dirty = True
+        self.drawn_at = 0
+        self.drawn_count = 0
+        self.view = None
+        self._frames = {}
+        self._images = []
+
+        table = []
+        for image in images:
+            if isinstance(image, pyglet.image.Animation):
+                frames = [frame.image for frame in image.frames]
+                duration = image.frames[0].duration or 0
+            else:
+                frames = [image]
+                duration = 0
+            self._frames[id(image)] = (len(table), len(frames), duration)
+            self._images.append(image)
+            table.extend(frame.get_texture() for frame in frames)
+
+        self.texture = table[0]
+        if any(frame.id != self.texture.id for frame in table):
+            raise ValueError('All frames must belong to the same texture')
+
+        self._create_frame_table(table)
+        self._create_buffers()
+        self.program = _link_program(
+            _compile_shader(gl.GL_VERTEX_SHADER, _VERTEX_SHADER),
+            _compile_shader(gl.GL_FRAGMENT_SHADER, _FRAGMENT_SHADER),
+            attributes=('corner',) + tuple(name for name, _, _ in _ATTRIBUTES)
+        )
+        self._uniforms = {
+            name: gl.glGetUniformLocation(self.program, ctypes.create_string_buffer(name.encode()))
+            for name in ('atlas', 'frames', 'time')
+        }
+
+    @property
+    def time(self):
+        return self.clock() - self.epoch
+
+    def _create_frame_table(self, table):
+        # Row 0 holds texture coordinates, row 1 size and anchor in pixels
+        data = np.zeros((2, len(table), 4), dtype=np.float32)
+        for index, frame in enumerate(table):
+            coords = frame.tex_coords
+            data[0, index] = (coords[0], coords[1], coords[6], coords[7])
+            data[1, index] = (frame.width, frame.height, frame.anchor_x, frame.anchor_y)
+
+        self.frame_table = gl.GLuint()
+        gl.glGenTextures(1, ctypes.byref(self.frame_table))
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.frame_table)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glTexImage2D(
+            gl.GL_TEXTURE_2D, 0, gl.GL_RGBA32F, len(table), 2, 0, gl.GL_RGBA, gl.GL_FLOAT,
+            data.ctypes.data
+        )
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+
+    def _create_buffers(self):
+        corners = np.array((0, 0, 1, 0, 0, 1, 1, 1), dtype=np.float32)
+        self.corner_buffer = gl.GLuint()
+        gl.glGenBuffers(1, ctypes.byref(self.corner_buffer))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.corner_buffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, corners.nbytes, corners.ctypes.data, gl.GL_STATIC_DRAW)
+
+        self.instance_buffer = gl.GLuint()
+        gl.glGenBuffers(1, ctypes.byref(self.instance_buffer))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+
+    def frames_of(self, image):
+        try:
+            return self._frames[id(image)]
+        except KeyError:
+            raise ValueError(f'{image!r} is not registered in this renderer') from None
+
+    def create_sprite(self, image, x=0, y=0, loop=True, sprite_class=InstancedSprite):
+        return sprite_class(self, image, x, y, loop)
+
+    def add(self, sprite):
+        if self.count == len(self.instances):
+            self.instances = np.concatenate((self.instances, np.zeros_like(self.instances)))
+
+        sprite._slot = self.count
+        self.instances[self.count] = sprite._state
+        self.sprites.append(sprite)
+        self.count += 1
+        self.dirty = True
+
+    def remove(self, sprite):
+        slot = sprite._slot
+        last = self.count - 1
+        if slot != last:
+            moved = self.sprites[last]
+            self.instances[slot] = self.instances[last]
+            self.sprites[slot] = moved
+            moved._slot = slot
+
+        self.sprites.pop()
+        self.count -= 1
+        sprite._slot = None
+        self.dirty = True
+
+    def set_view(self, rect):
+        """Only sprites anchored inside the rectangle are drawn and animated."""
+        self.view = rect
+        self.dirty = True
+
+    def on_screen(self):
+        instances = self.instances[:self.count]
+        if self.view is None:
+            return np.ones(self.count, dtype=bool)
+
+        xs = instances[:, 0]
+        ys = instances[:, 1]
+        view = self.view
+        return (xs >= view.x1) & (xs <= view.x2) & (ys >= view.y1) & (ys <= view.y2)
+
+    def update(self):
+        """Notify the sprites whose non-looping animation has finished."""
+        instances = self.instances[:self.count]
+        finished = np.flatnonzero(
+            (instances[:, 12] == 0) &
+            (self.time >= instances[:, 11] + instances[:, 9] * instances[:, 10])
+        )
+        for sprite in [self.sprites[slot] for slot in finished]:
+            # Stay on the last frame without being notified again until restarted
+            sprite._set(12, -1)
+            sprite.on_animation_end()
+
+    def frame_change_delay(self):
+        """Seconds until an animation shows a frame different from the last drawn one.
+
+        Returns None when no visible sprite is animated.
+        """
+        instances = self.instances[:self.count][self.on_screen()]
+        animated = instances[(instances[:, 10] > 0) & (instances[:, 12] >= 0)]
+        if not len(animated):
+            return None
+
+        start = animated[:, 11]
+        duration = animated[:, 10]
+        changes = start + (np.floor((self.drawn_at - start) / duration) + 1) * duration
+        return max(float(changes.min()) - self.time, 0)
+
+    def draw(self):
+        self.drawn_at = self.time
+        if self.dirty:
+            drawn = np.ascontiguousarray(self.instances[:self.count][self.on_screen()])
+            self.drawn_count = len(drawn)
+            if self.drawn_count:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instance_buffer)
+                gl.glBufferData(gl.GL_ARRAY_BUFFER, drawn.nbytes, drawn.ctypes.data, gl.GL_DYNAMIC_DRAW)
+            self.dirty = False
+
+        if not self.drawn_count:
+            return
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instance_buffer)
+
+        gl.glUseProgram(self.program)
+        gl.glActiveTexture(gl.GL_TEXTURE1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.frame_table)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(self.texture.target, self.texture.id)
+        gl.glUniform1i(self._uniforms['atlas'], 0)
+        gl.glUniform1i(self._uniforms['frames'], 1)
+        gl.glUniform1f(self._uniforms['time'], self.time)
+
+        for location, (_, size, column) in enumerate(_ATTRIBUTES, 1):
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(location, size, gl.GL_FLOAT, gl.GL_FALSE, _COLUMNS * 4, column * 4)
+            gl.glVertexAttribDivisor(location, 1)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.corner_buffer)
+        gl.glEnableVertexAttribArray(0)
+        gl.glVertexAttribPointer(0, 2, gl.GL_FLOAT, gl.GL_FALSE, 0, 0)
+
+        gl.glDrawArraysInstanced(gl.GL_TRIANGLE_STRIP, 0, 4, self.drawn_count)
+
+        for location in range(len(_ATTRIBUTES) + 1):
+            gl.glVertexAttribDivisor(location, 0)
+            gl.glDisableVertexAttribArray(location)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glActiveTexture(gl.GL_TEXTURE1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glUseProgram(0)
+
+    def delete(self):
+        gl.glDeleteProgram(self.program)
+        gl.glDeleteTextures(1, ctypes.byref(self.frame_table))
+        gl.glDeleteBuffers(1, ctypes.byref(self.corner_buffer))
+        gl.glDeleteBuffers(1, ctypes.byref(self.instance_buffer))
@@ -0,0 +1,226 @@
+import ctypes
+from collections import OrderedDict
+
+import pyglet
+from pyglet import gl
+
+from geometry import Rectangle
+from gameutil import BACKGROUND, FOREGROUND, TILE_WIDTH, TILE_HEIGHT
+
+
+class Framebuffer:
+    def __init__(self):
+        self.id = gl.GLuint()
+        gl.glGenFramebuffers(1, ctypes.byref(self.id))
+
+    def render(self, texture, batches):
+        """Draw the batches into the texture, composited over opaque black."""
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, self.id)
+        gl.glFramebufferTexture2D(gl.GL_FRAMEBUFFER, gl.GL_COLOR_ATTACHMENT0, texture.target, texture.id, 0)
+        status = gl.glCheckFramebufferStatus(gl.GL_FRAMEBUFFER)
+        if status != gl.GL_FRAMEBUFFER_COMPLETE:
+            gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+            raise RuntimeError(f'Framebuffer is incomplete: {status:#x}')
+
+        gl.glPushAttrib(gl.GL_VIEWPORT_BIT | gl.GL_COLOR_BUFFER_BIT | gl.GL_ENABLE_BIT)
+        gl.glViewport(0, 0, texture.width, texture.height)
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glPushMatrix()
+        gl.glLoadIdentity()
+        gl.glOrtho(0, texture.width, 0, texture.height, -1, 1)
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+        gl.glPushMatrix()
+        gl.glLoadIdentity()
+
+        gl.glClearColor(0, 0, 0, 1)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+        gl.glEnable(gl.GL_BLEND)
+        for batch in batches:
+            batch.draw()
+
+        # Sprite groups set their own blend func, which lowers the alpha of
+        # partially transparent texels, so the alpha channel is reset to 1
+        # afterwards to keep the cached texture opaque
+        gl.glColorMask(gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE, gl.GL_TRUE)
+        gl.glClear(gl.GL_COLOR_BUFFER_BIT)
+
+        gl.glPopMatrix()
+        gl.glMatrixMode(gl.GL_PROJECTION)
+        gl.glPopMatrix()
+        gl.glMatrixMode(gl.GL_MODELVIEW)
+        gl.glPopAttrib()
+        gl.glBindFramebuffer(gl.GL_FRAMEBUFFER, 0)
+
+    def delete(self):
+        gl.glDeleteFramebuffers(1, ctypes.byref(self.id))
+
+
+class MapChunk:
+    __slots__ = ('rect', 'texture', 'background_texture', 'sprite', 'overrides')
+
+    def __init__(self, rect):
+        self.rect = rect
+        self.texture = None
+        self.background_texture = None
+        self.sprite = None
+        self.overrides = {}
+
+    def delete(self):
+        if self.sprite is not None:
+            self.sprite.delete()
+        for sprite in self.overrides.values():
+            sprite.delete()
+        self.sprite = None
+        self.overrides = {}
+        self.texture = None
+        self.background_texture = None
+
+
+class MapCache:
+    """Static map layers rendered once per chunk into textures.
+
+    Every chunk is baked twice: the full terrain (backgrounds and foregrounds)
+    drawn as a single textured quad, and the backgrounds alone, which is only
+    used to paint over foregrounds hidden by creatures standing on them. Chunks
+    are baked lazily when they become visible and the least recently seen ones
+    are dropped once there are more than ``max_chunks`` of them.
+    """
+
+    def __init__(self, grid, batch, scale=1, chunk_size=16, max_chunks=64):
+        self.grid = grid
+        self.map_width = grid.width
+        self.map_height = grid.height
+        self.batch = batch
+        self.scale = scale
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.framebuffer = None
+        self.dirty = True
+
+    def chunk_key(self, x, y):
+        return x // self.chunk_size, y // self.chunk_size
+
+    def chunk_rect(self, key):
+        x1 = key[0] * self.chunk_size
+        y1 = key[1] * self.chunk_size
+        x2 = min(x1 + self.chunk_size, self.map_width) - 1
+        y2 = min(y1 + self.chunk_size, self.map_height) - 1
+        return Rectangle(x1, y1, x2, y2)
+
+    def tile_origin(self, x, y):
+        """Bottom left pixel of the tile cell."""
+        return (
+            x * TILE_WIDTH * self.scale,
+            (self.map_height - y - 1) * TILE_HEIGHT * self.scale
+        )
+
+    def update(self, visible):
+        """Bake the chunks overlapping the visible tile rectangle."""
+        first = self.chunk_key(max(visible.x1, 0), max(visible.y1, 0))
+        last = self.chunk_key(min(visible.x2, self.map_width - 1), min(visible.y2, self.map_height - 1))
+        for chunk_y in range(first[1], last[1] + 1):
+            for chunk_x in range(first[0], last[0] + 1):
+                key = (chunk_x, chunk_y)
+                if key in self.chunks:
+                    self.chunks.move_to_end(key)
+                else:
+                    self.chunks[key] = self.bake(key)
+                    self.dirty = True
+
+        while len(self.chunks) > self.max_chunks:
+            _, chunk = self.chunks.popitem(last=False)
+            chunk.delete()
+
+    def bake(self, key):
+        if self.framebuffer is None:
+            self.framebuffer = Framebuffer()
+
+        chunk = MapChunk(self.chunk_rect(key))
+        rect = chunk.rect
+        width = rect.width + 1
+        height = rect.height + 1
+
+        background_batch = pyglet.graphics.Batch()
+        foreground_batch = pyglet.graphics.Batch()
+        sprites = []
+        index = self.grid.region(rect)
+        for position in index[self.grid.types[index] != 0].tolist():
+            y, x = divmod(position, self.map_width)
+            local_x = (x - rect.x1) * TILE_WIDTH + TILE_WIDTH // 2
+            local_y = (rect.y2 - y + 1) * TILE_HEIGHT - TILE_HEIGHT // 2
+            if background := self.grid.layer(position, 'background'):
+                sprites.append(background.create_sprite(local_x, local_y, background_batch, BACKGROUND))
+            if foreground := self.grid.layer(position, 'foreground'):
+                sprites.append(foreground.create_sprite(local_x, local_y, foreground_batch, FOREGROUND))
+
+        chunk.background_texture = pyglet.image.Texture.create(width * TILE_WIDTH, height * TILE_HEIGHT)
+        chunk.texture = pyglet.image.Texture.create(width * TILE_WIDTH, height * TILE_HEIGHT)
+        self.framebuffer.render(chunk.background_texture, (background_batch,))
+        self.framebuffer.render(chunk.texture, (background_batch, foreground_batch))
+        for sprite in sprites:
+            sprite.delete()
+
+        chunk.sprite = pyglet.sprite.Sprite(
+            chunk.texture, *self.tile_origin(rect.x1, rect.y2), batch=self.batch, group=BACKGROUND
+        )
+        if self.scale > 1:
+            chunk.sprite.scale = self.scale
+
+        for position in index[~self.grid.foreground_visibility(index)].tolist():
+            y, x = divmod(position, self.map_width)
+            self._add_override(chunk, x, y)
+
+        return chunk
+
+    def _add_override(self, chunk, x, y):
+        if not self.grid.has_foreground(x, y):
+            return
+
+        rect = chunk.rect
+        region = chunk.background_texture.get_region(
+            (x - rect.x1) * TILE_WIDTH, (rect.y2 - y) * TILE_HEIGHT, TILE_WIDTH, TILE_HEIGHT
+        )
+        sprite = pyglet.sprite.Sprite(region, *self.tile_origin(x, y), batch=self.batch, group=FOREGROUND)
+        if self.scale > 1:
+            sprite.scale = self.scale
+        chunk.overrides[x, y] = sprite
+        self.dirty = True
+
+    def hide_foreground(self, x, y):
+        # Tiles that are not loaded yet are remembered too, their foreground is
+        # hidden once the chunk is baked
+        if not self.grid.foreground_visible(x, y):
+            return
+
+        self.grid.set_foreground_visible(x, y, False)
+        if chunk := self.chunks.get(self.chunk_key(x, y)):
+            self._add_override(chunk, x, y)
+
+    def show_foreground(self, x, y):
+        if self.grid.foreground_visible(x, y):
+            return
+
+        self.grid.set_foreground_visible(x, y, True)
+        chunk = self.chunks.get(self.chunk_key(x, y))
+        if chunk and (sprite := chunk.overrides.pop((x, y), None)):
+            sprite.delete()
+            self.dirty = True
+
+    def invalidate(self, rect):
+        """Drop the baked chunks overlapping the tile rectangle, they are baked again when visible."""
+        first = self.chunk_key(rect.x1, rect.y1)
+        last = self.chunk_key(rect.x2, rect.y2)
+        for chunk_y in range(first[1], last[1] + 1):
+            for chunk_x in range(first[0], last[0] + 1):
+                if chunk := self.chunks.pop((chunk_x, chunk_y), None):
+                    chunk.delete()
+                    self.dirty = True
+
+    def delete(self):
+        for chunk in self.chunks.values():
+            chunk.delete()
+        self.chunks.clear()
+        if self.framebuffer is not None:
+            self.framebuffer.delete()
+            self.framebuffer = None
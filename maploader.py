@@ -0,0 +1,64 @@
+import base64
+import time
+from collections import deque
+
+import numpy as np
+
+from geometry import Rectangle
+
+
+class MapLoader:
+    """Turns map chunks into tiles a few at a time, so the game stays responsive while loading.
+
+    Streaming servers answer ``connect`` with a ``map_header`` message carrying
+    the map size, seed and actors, followed by ``map_chunk`` messages ordered
+    by distance from the player::
+
+        {"type": "map_header", "map": {"width": 512, "height": 512, "seed": 7}, "actors": [...]}
+        {"type": "map_chunk", "x": 32, "y": 16, "width": 16, "height": 16, "tiles": "<base64 uint8>"}
+
+    ``tiles`` holds row-major Tile.Type codes, either base64 encoded bytes or a
+    plain list. Chunks are only queued when received and are decoded in
+    ``process`` within a per-frame time budget.
+    """
+
+    def __init__(self, grid, seed=None, budget=0.004):
+        self.grid = grid
+        self.seed = seed
+        self.budget = budget
+        self.pending = deque()
+
+    def push(self, x, y, width, height, data):
+        self.pending.append((Rectangle(x, y, x + width - 1, y + height - 1), data))
+
+    def split(self, tile_types, origin_x, origin_y, chunk_size=16):
+        """Queue a whole map, nearest chunks to the origin first."""
+        tile_types = np.asarray(tile_types).reshape(self.grid.height, self.grid.width)
+        chunks = []
+        for y in range(0, self.grid.height, chunk_size):
+            for x in range(0, self.grid.width, chunk_size):
+                data = tile_types[y:y + chunk_size, x:x + chunk_size]
+                distance = (x + data.shape[1] / 2 - origin_x) ** 2 + (y + data.shape[0] / 2 - origin_y) ** 2
+                chunks.append((distance, x, y, data))
+
+        chunks.sort(key=lambda chunk: chunk[0])
+        for _, x, y, data in chunks:
+            self.push(x, y, data.shape[1], data.shape[0], data)
+
+    @staticmethod
+    def decode(data):
+        if isinstance(data, str):
+            return np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+        return np.asarray(data).ravel()
+
+    def process(self):
+        """Load queued chunks until the time budget runs out, returns the loaded rectangles."""
+        loaded = []
+        deadline = time.perf_counter() + self.budget
+        while self.pending and (not loaded or time.perf_counter() < deadline):
+            rect, data = self.pending.popleft()
+            seed = None if self.seed is None else [self.seed, rect.x1, rect.y1]
+            self.grid.fill(rect, self.decode(data), seed)
+            loaded.append(rect)
+
+        return loaded
@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+import pyglet
+from pyglet import gl
+
+from tilegrid import NO_LAYER
+
+
+class _DotGroup(pyglet.graphics.OrderedGroup):
+    def __init__(self, order, size, parent=None):
+        super().__init__(order, parent)
+        self.size = size
+
+    def set_state(self):
+        gl.glPointSize(self.size)
+
+    def unset_state(self):
+        gl.glPointSize(1)
+
+
+class Minimap:
+    """Overview of the whole map drawn from a single texture with one texel per tile.
+
+    Terrain texels are computed from the TileGrid arrays when a region is
+    loaded, so nothing is redrawn in full after the first upload. Maps larger
+    than the minimap are minified through mipmaps, which are regenerated
+    before drawing when the terrain changed. Actors are drawn on top as
+    screen-space points of at least ``dot_size`` pixels, so they never fall
+    between sampled texels. ``dirty`` is set on every change until the window
+    has drawn it.
+    """
+
+    dot_size = 2
+
+    def __init__(self, grid, palette, max_size, batch, group=None):
+        self.grid = grid
+        self.palette = palette
+        self.batch = batch
+        scale = min(max_size / grid.width, max_size / grid.height)
+        self.minified = scale < 1
+        self.texture = pyglet.image.Texture.create(
+            grid.width, grid.height,
+            min_filter=gl.GL_LINEAR_MIPMAP_LINEAR if self.minified else gl.GL_NEAREST,
+            mag_filter=gl.GL_LINEAR if self.minified else gl.GL_NEAREST
+        )
+        self.sprite = pyglet.sprite.Sprite(
+            self.texture, batch=batch, group=pyglet.graphics.OrderedGroup(0, group)
+        )
+        self.sprite.scale = scale
+        self.dot_group = _DotGroup(1, max(self.dot_size, math.ceil(scale)), group)
+        self.dots = {}
+        self.positions = {}
+        self.mipmaps_stale = self.minified
+        self.dirty = True
+
+    def set_position(self, x, y):
+        self.sprite.update(x, y)
+        for actor_id, vertex_list in self.dots.items():
+            vertex_list.vertices[:] = self.dot_coords(*self.positions[actor_id])
+        self.dirty = True
+
+    def dot_coords(self, x, y):
+        """Window position of the center of a tile on the minimap."""
+        scale = self.sprite.scale
+        return (
+            self.sprite.x + (x + 0.5) * scale,
+            self.sprite.y + (self.grid.height - y - 0.5) * scale
+        )
+
+    def _upload(self, data, x, y):
+        height, width = data.shape[:2]
+        image = pyglet.image.ImageData(width, height, 'RGBA', data.tobytes())
+        self.texture.blit_into(image, x, y, 0)
+        self.mipmaps_stale = self.minified
+        self.dirty = True
+
+    def refresh(self, rect):
+        """Recompute the terrain texels of a tile rectangle."""
+        grid = self.grid
+        index = grid.region(rect)
+        colors = self.palette.colors
+        texels = np.zeros((len(index), 4), dtype=np.uint8)
+        texels[:, :3] = np.where(
+            (grid.foregrounds[index] != NO_LAYER)[:, np.newaxis],
+            colors[grid.foreground_colors[index]],
+            colors[grid.background_colors[index]]
+        )
+        texels[:, 3] = 255
+        texels[(grid.types[index] == 0) | (
+            (grid.backgrounds[index] == NO_LAYER) & (grid.foregrounds[index] == NO_LAYER)
+        ), :3] = 0
+
+        # Texture rows go bottom to top, while tile rows go top to bottom
+        block = np.flipud(texels.reshape(rect.height + 1, rect.width + 1, 4))
+        self._upload(block, rect.x1, self.grid.height - 1 - rect.y2)
+
+    def update(self):
+        """Regenerate the mipmaps of a minified minimap if the terrain changed, call before drawing."""
+        if self.mipmaps_stale:
+            gl.glBindTexture(self.texture.target, self.texture.id)
+            gl.glGenerateMipmap(self.texture.target)
+            gl.glBindTexture(self.texture.target, 0)
+            self.mipmaps_stale = False
+
+    def move_actor(self, actor_id, x, y, color):
+        self.positions[actor_id] = (x, y)
+        if (vertex_list := self.dots.get(actor_id)) is None:
+            self.dots[actor_id] = self.batch.add(
+                1, gl.GL_POINTS, self.dot_group, ('v2f', self.dot_coords(x, y)), ('c3B', tuple(color))
+            )
+        else:
+            vertex_list.vertices[:] = self.dot_coords(x, y)
+            vertex_list.colors[:] = tuple(color)
+        self.dirty = True
+
+    def remove_actor(self, actor_id):
+        if (vertex_list := self.dots.pop(actor_id, None)) is None:
+            return
+
+        del self.positions[actor_id]
+        vertex_list.delete()
+        self.dirty = True
+
+    def delete(self):
+        for vertex_list in self.dots.values():
+            vertex_list.delete()
+        self.dots.clear()
+        self.positions.clear()
+        self.sprite.delete()
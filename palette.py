@@ -0,0 +1,78 @@
+import colorsys
+import itertools
+
+import numpy as np
+
+_color_max_values = {'h': 360.0, 's': 100.0, 'v': 100.0}
+_default_hsv = {'h': 0, 's': 0, 'v': 100}
+
+
+class Palette:
+    """Shared table of tile colors.
+
+    Every HSV range of the tileset color manifests is quantized into at most
+    ``steps`` values per channel and converted to RGB once, so tiles only keep
+    an index into ``colors``.
+    """
+
+    def __init__(self, steps=4):
+        self.steps = steps
+        self.colors = np.zeros((0, 3), dtype=np.uint8)
+        self._ranges = {}
+
+    def __getitem__(self, index):
+        return tuple(self.colors[index].tolist())
+
+    @classmethod
+    def from_tileset(cls, tileset, steps=4):
+        palette = cls(steps)
+        for manifests in tileset.values():
+            for manifest in manifests:
+                palette.register(cls.layer_color(manifest, 'background'))
+                palette.register(cls.layer_color(manifest, 'foreground'))
+        return palette
+
+    @staticmethod
+    def layer_color(manifest, layer):
+        return (manifest.get('color') or {}).get(layer)
+
+    @staticmethod
+    def _key(spec):
+        if not spec:
+            return None
+        return tuple(
+            (channel, tuple(value) if isinstance(value, list) else value)
+            for channel, value in sorted(spec.items())
+        )
+
+    def register(self, spec):
+        """Offset and size of the colors generated from an HSV manifest."""
+        key = self._key(spec)
+        if key in self._ranges:
+            return self._ranges[key]
+
+        channels = []
+        for channel in 'hsv':
+            value = (spec or {}).get(channel, _default_hsv[channel])
+            if isinstance(value, list):
+                low, high = value
+                values = np.unique(np.round(np.linspace(low, high, min(self.steps, high - low + 1))))
+            else:
+                values = (value,)
+            channels.append([value / _color_max_values[channel] for value in values])
+
+        table = np.array(
+            [
+                [int(component * 255) for component in colorsys.hsv_to_rgb(h, s, v)]
+                for h, s, v in itertools.product(*channels)
+            ],
+            dtype=np.uint8
+        )
+        self._ranges[key] = (len(self.colors), len(table))
+        self.colors = np.concatenate((self.colors, table))
+        return self._ranges[key]
+
+    def pick(self, spec, count, rng):
+        """Random color indices for count tiles sharing the same HSV manifest."""
+        offset, size = self.register(spec)
+        return (offset + rng.integers(0, size, size=count)).astype(np.uint16)
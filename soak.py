@@ -0,0 +1,354 @@
+"""Long-running soak test of the client.
+
+Drives a hidden MainWindow straight through its websocket handlers with a
+synthetic server or a recorded message stream (see ``app.py --record``).
+Hours of simulated play are compressed into minutes of wall time. Python
+allocations, live objects by type and batch vertex counts are sampled along
+the way, and the run fails with a diff report when memory keeps growing after
+the warm-up::
+
+    python soak.py --hours 4 --max-growth 8
+    python soak.py --replay session.jsonl --hours 1
+
+The window is hidden but still needs an X display and OpenGL, on machines
+without one run it under Xvfb::
+
+    xvfb-run -a python soak.py
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+
+import pyglet
+
+
+class SimulatedClock:
+    """Monotonic clock advanced by the soak loop instead of the wall clock."""
+
+    def __init__(self):
+        self.base = time.perf_counter()
+        self.elapsed = 0.0
+
+    def __call__(self):
+        return self.base + self.elapsed
+
+    def advance(self, dt):
+        self.elapsed += dt
+
+
+class SyntheticServer:
+    """Random but plausible server traffic: a streamed map, wandering goblins, fights and respawns."""
+
+    def __init__(self, player_name, width=128, height=128, creatures=150, seed=0):
+        self.random = random.Random(seed)
+        self.player_name = player_name
+        self.width = width
+        self.height = height
+        self.creatures = creatures
+        self.actors = {}
+        self.next_id = 1
+        self.time = 0
+
+    def _spawn(self, kind='goblin', name=None):
+        actor = {
+            'id': self.next_id,
+            'kind': kind,
+            'position': {'x': self.random.randrange(self.width), 'y': self.random.randrange(self.height)},
+            'exhausted': False,
+            'prepared_to_battle': False,
+            'stamina': 100
+        }
+        if name is not None:
+            actor['name'] = name
+        self.actors[actor['id']] = actor
+        self.next_id += 1
+        return actor
+
+    def _state(self, actor):
+        return {
+            'id': actor['id'],
+            'position': dict(actor['position']),
+            'exhausted': actor['exhausted'],
+            'prepared_to_battle': actor['prepared_to_battle'],
+            'stamina': actor['stamina']
+        }
+
+    def initial_messages(self):
+        self.player = self._spawn('player', self.player_name)
+        for _ in range(self.creatures):
+            self._spawn()
+
+        yield {
+            'type': 'map_header',
+            'map': {'width': self.width, 'height': self.height, 'seed': self.random.randrange(2 ** 31)},
+            'actors': list(self.actors.values())
+        }
+        for y in range(0, self.height, 16):
+            for x in range(0, self.width, 16):
+                width = min(16, self.width - x)
+                height = min(16, self.height - y)
+                yield {
+                    'type': 'map_chunk', 'x': x, 'y': y, 'width': width, 'height': height,
+                    'tiles': [self.random.choice((1, 3, 8, 9)) for _ in range(width * height)]
+                }
+
+    def tick(self):
+        self.time += 1
+        actions = []
+        goblins = [actor for actor in self.actors.values() if actor is not self.player]
+
+        for actor in self.random.sample(goblins, min(len(goblins), 20)):
+            previous = dict(actor['position'])
+            position = actor['position']
+            position['x'] = min(max(position['x'] + self.random.choice((-1, 0, 1)), 0), self.width - 1)
+            position['y'] = min(max(position['y'] + self.random.choice((-1, 0, 1)), 0), self.height - 1)
+            actor['exhausted'] = self.random.random() < 0.1
+            actions.append({
+                'type': 'move', 'success': True, 'actor': self._state(actor), 'previous_position': previous
+            })
+
+        for actor in self.random.sample(goblins, min(len(goblins), 3)):
+            actor['prepared_to_battle'] = True
+            actions.append({
+                'type': 'prepare_to_battle', 'actor': self._state(actor),
+                'subtype': self.random.choice(('attack', 'defence')), 'energy': self.random.randrange(100)
+            })
+
+        for _ in range(2):
+            attacker, defender = self.random.sample(goblins, 2)
+            attacker['prepared_to_battle'] = False
+            alive = self.random.random() < 0.7
+            actions.append({
+                'type': 'attack', 'success': True, 'actor': self._state(attacker),
+                'defender': self._state(defender), 'defender_alive': alive
+            })
+            if not alive:
+                del self.actors[defender['id']]
+                goblins.remove(defender)
+
+        yield {
+            'type': 'update', 'time': self.time, 'actions': actions,
+            'players': [self._state(self.player)]
+        }
+
+        while len(self.actors) <= self.creatures:
+            yield {'type': 'player_connected', 'player': self._spawn()}
+
+
+class RecordedServer:
+    """Replays a recorded session, looping over everything after the initial map."""
+
+    def __init__(self, path):
+        with open(path, 'rt') as file:
+            messages = [json.loads(line) for line in file if line.strip()]
+
+        initial_types = ('game_initialized', 'map_header', 'map_chunk')
+        self.initial = [message for message in messages if message.get('type') in initial_types]
+        self.loop = [message for message in messages if message.get('type') not in initial_types]
+        self.position = 0
+        self.time = 0
+
+    def initial_messages(self):
+        yield from self.initial
+
+    def tick(self):
+        if not self.loop:
+            return
+
+        message = dict(self.loop[self.position])
+        self.position = (self.position + 1) % len(self.loop)
+        if message.get('type') == 'update':
+            self.time += 1
+            message['time'] = self.time
+        yield message
+
+
+@dataclass
+class Sample:
+    simulated: float
+    traced: int
+    rss: int
+    objects: Counter
+    vertices: Counter
+    counters: dict = field(default_factory=dict)
+
+
+def resident_memory():
+    try:
+        with open('/proc/self/statm', 'rt') as file:
+            return int(file.read().split()[1]) * 4096
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def batch_vertices(name, batch):
+    vertices = Counter()
+    for group, domains in batch.group_map.items():
+        for domain in domains.values():
+            vertices[f'{name}:{type(group).__name__}'] += sum(domain.allocator.sizes)
+    return vertices
+
+
+def take_sample(window, simulated):
+    from gameutil import GameResources
+
+    gc.collect()
+    vertices = batch_vertices('world', GameResources.batch) + batch_vertices('ui', GameResources.ui_batch)
+    counters = {
+        'creatures': len(window.creatures),
+        'creature instances': GameResources.creature_renderer.count,
+        'fx instances': GameResources.fx_renderer.count,
+        'blood pool': len(window.blood_pool.pool),
+        'moving sprites': len(window.moving_sprites),
+        'rotating sprites': len(window.rotating_sprites),
+        'baked chunks': len(window.map_cache.chunks) if window.map_cache else 0,
+    }
+    return Sample(
+        simulated,
+        tracemalloc.get_traced_memory()[0],
+        resident_memory(),
+        Counter(type(obj).__name__ for obj in gc.get_objects()),
+        vertices,
+        counters
+    )
+
+
+def diff_report(baseline, last, baseline_snapshot, last_snapshot, limit=15):
+    lines = [
+        f'Traced memory: {baseline.traced / 2 ** 20:.1f} MB -> {last.traced / 2 ** 20:.1f} MB',
+        f'Resident memory: {baseline.rss / 2 ** 20:.1f} MB -> {last.rss / 2 ** 20:.1f} MB',
+        '', 'Top allocation growth:'
+    ]
+    for stat in last_snapshot.compare_to(baseline_snapshot, 'lineno')[:limit]:
+        lines.append(f'  {stat}')
+
+    lines += ['', 'Live object growth:']
+    growth = last.objects.copy()
+    growth.subtract(baseline.objects)
+    for name, count in growth.most_common(limit):
+        if count <= 0:
+            break
+        lines.append(f'  {name}: +{count} ({last.objects[name]} live)')
+
+    lines += ['', 'Batch vertices:']
+    for name in sorted(set(baseline.vertices) | set(last.vertices)):
+        lines.append(f'  {name}: {baseline.vertices[name]} -> {last.vertices[name]}')
+
+    lines += ['', 'Client state:']
+    for name, value in last.counters.items():
+        lines.append(f'  {name}: {baseline.counters.get(name)} -> {value}')
+
+    return '\n'.join(lines)
+
+
+def run(args):
+    from app import MainWindow, setup_resources
+    from gameutil import GameResources
+
+    setup_resources()
+    tracemalloc.start(25)
+
+    clock = SimulatedClock()
+    # No pyglet event loop runs here, so events would only pile up in the
+    # window's queue instead of being dispatched (on_draw included)
+    pyglet.window.Window._enable_event_queue = False
+    window = MainWindow(width=960, height=720, visible=False)
+    GameResources.load_resources()
+    window.initialize()
+    GameResources.creature_renderer.clock = clock
+    GameResources.fx_renderer.clock = clock
+
+    if args.replay:
+        server = RecordedServer(args.replay)
+    else:
+        server = SyntheticServer(window.player_name, args.map_size, args.map_size, args.creatures, args.seed)
+
+    def dispatch(message):
+        handler = getattr(window, f'on_{message["type"]}_ws_received', None)
+        if handler:
+            handler(message)
+
+    for message in server.initial_messages():
+        dispatch(message)
+
+    frame = 1 / 60
+    ticks = int(args.hours * 3600 / args.tick)
+    sample_every = max(int(args.sample_interval * 60 / args.tick), 1)
+    warmup = int(ticks * args.warmup)
+    baseline = baseline_snapshot = None
+    samples = []
+    started = time.perf_counter()
+    if warmup == 0:
+        # Without a warm-up the baseline is the state right after the initial map
+        baseline = take_sample(window, clock.elapsed)
+        baseline_snapshot = tracemalloc.take_snapshot()
+
+    for tick in range(1, ticks + 1):
+        for message in server.tick():
+            dispatch(message)
+
+        # A few frames per server tick are enough to finish most easing
+        # and expire blood, the simulated clock covers the rest of the tick
+        for _ in range(args.frames_per_tick):
+            clock.advance(frame)
+            window.update(frame)
+        clock.advance(args.tick - args.frames_per_tick * frame)
+
+        if tick % args.draw_every == 0:
+            window.switch_to()
+            window.dispatch_event('on_draw')
+            window.flip()
+
+        if tick % sample_every == 0 or tick == warmup:
+            sample = take_sample(window, clock.elapsed)
+            samples.append(sample)
+            print(
+                f'{sample.simulated / 3600:6.2f} h  traced {sample.traced / 2 ** 20:7.1f} MB  '
+                f'rss {sample.rss / 2 ** 20:7.1f} MB  objects {sum(sample.objects.values())}  '
+                f'creatures {sample.counters["creatures"]}',
+                flush=True
+            )
+            if tick == warmup:
+                baseline = sample
+                baseline_snapshot = tracemalloc.take_snapshot()
+
+    last = take_sample(window, clock.elapsed)
+    last_snapshot = tracemalloc.take_snapshot()
+    growth = (last.traced - baseline.traced) / 2 ** 20
+    print(f'\nSimulated {clock.elapsed / 3600:.2f} h in {time.perf_counter() - started:.0f} s')
+    print(diff_report(baseline, last, baseline_snapshot, last_snapshot))
+    window.close()
+
+    if growth > args.max_growth:
+        print(f'\nFAILED: traced memory grew by {growth:.1f} MB after warm-up (limit {args.max_growth} MB)')
+        return 1
+
+    print(f'\nOK: traced memory grew by {growth:.1f} MB after warm-up')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hours', type=float, default=4, help='simulated play time')
+    parser.add_argument('--tick', type=float, default=0.5, help='simulated seconds between server updates')
+    parser.add_argument('--frames-per-tick', type=int, default=4, help='client updates run per server update')
+    parser.add_argument('--draw-every', type=int, default=20, help='server updates between drawn frames')
+    parser.add_argument('--sample-interval', type=float, default=10, help='simulated minutes between samples')
+    parser.add_argument('--warmup', type=float, default=0.1, help='share of the run ignored for the baseline')
+    parser.add_argument('--max-growth', type=float, default=8, help='allowed traced memory growth in MB')
+    parser.add_argument('--replay', metavar='PATH', help='recorded session from app.py --record')
+    parser.add_argument('--map-size', type=int, default=128)
+    parser.add_argument('--creatures', type=int, default=150)
+    parser.add_argument('--seed', type=int, default=0)
+    return run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import sys
+import time
+
+
+class StartupProfile:
+    """Wall time of each startup phase, counted from the import of this module.
+
+    Phases are always recorded since marking one is cheap, the report is only
+    printed when enabled with ``app.py --profile-startup``.
+    """
+
+    first_frame_goal = 0.3
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last, now - self.started))
+        self.last = now
+
+    def elapsed(self, name):
+        for phase, _, total in self.phases:
+            if phase == name:
+                return total
+        return None
+
+    def report(self, file=sys.stderr):
+        if not self.enabled:
+            return
+
+        print(f'{"phase":<28} {"took":>9} {"total":>9}', file=file)
+        for name, duration, total in self.phases:
+            print(f'{name:<28} {duration * 1000:6.1f} ms {total * 1000:6.1f} ms', file=file)
+
+        if (first_frame := self.elapsed('first frame')) is not None:
+            verdict = 'within' if first_frame <= self.first_frame_goal else 'over'
+            print(
+                f'First frame after {first_frame * 1000:.0f} ms, {verdict} the '
+                f'{self.first_frame_goal * 1000:.0f} ms goal', file=file
+            )
+
+
+profile = StartupProfile()
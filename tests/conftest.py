@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The client modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pyglet
+except ImportError:
+    pass
+else:
+    # pyglet.gl opens a hidden window on import otherwise, the modules that
+    # only use pyglet indirectly can then be tested without a display
+    pyglet.options['shadow_window'] = False
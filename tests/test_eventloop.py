@@ -0,0 +1,76 @@
+import asyncio
+import os
+import select
+
+import pytest
+
+pyglet = pytest.importorskip('pyglet')
+
+from eventloop import CustomEventLoop  # noqa: E402
+
+
+class PipeDevice:
+    """Selectable input device standing in for the Xlib display connection."""
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+
+    def fileno(self):
+        return self.read_fd
+
+    def poll(self):
+        return bool(select.select([self.read_fd], [], [], 0)[0])
+
+    def send(self):
+        os.write(self.write_fd, b'x')
+
+    def close(self):
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+class XlibLikeEventLoop:
+    def __init__(self, devices):
+        # Named like pyglet 1.4's XlibEventLoop attribute
+        self._select_devices = set(devices)
+
+
+class IdleWindow:
+    invalid = False
+    _legacy_invalid = False
+
+    def __init__(self):
+        self.ws_messages_queue = []
+
+    def redraw_delay(self):
+        return None
+
+
+@pytest.fixture
+def device(monkeypatch):
+    device = PipeDevice()
+    monkeypatch.setattr(pyglet.app, 'platform_event_loop', XlibLikeEventLoop([device]))
+    yield device
+    device.close()
+
+
+def test_idle_loop_waits_for_input(device):
+    event_loop = CustomEventLoop()
+    event_loop.main_window = IdleWindow()
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        event_loop._watch_input_devices(loop)
+        assert event_loop._input_devices == [device]
+
+        idle = asyncio.ensure_future(event_loop.idle())
+        # Nothing is scheduled or animated, so there is no polling timeout
+        await asyncio.sleep(event_loop.input_poll_interval * 3)
+        assert not idle.done()
+
+        device.send()
+        assert await asyncio.wait_for(idle, 1) == 0
+        event_loop._unwatch_input_devices(loop)
+        assert event_loop._input_devices == ()
+
+    asyncio.run(scenario())
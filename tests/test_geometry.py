@@ -0,0 +1,119 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import geometry
+from geometry import Vector, Rectangle, VectorArray, RectangleArray
+
+RECTANGLES = [
+    Rectangle(0, 0, 1, 1),
+    Rectangle(2, 3, 7, 5),
+    Rectangle(-4, -2, 0, 6),
+    Rectangle(5, 5, 13, 9),
+]
+
+
+def test_vector_operand_matches_vector():
+    vectors = VectorArray([[1, 1], [2, 2]])
+    for operand in ((10, 20), [10, 20], np.array([10, 20]), Vector(10, 20)):
+        assert (vectors + operand).data.tolist() == [[11, 21], [12, 22]]
+        assert (vectors - operand).data.tolist() == [[-9, -19], [-8, -18]]
+
+    assert (vectors * np.array([[2], [3]])).data.tolist() == [[2, 2], [6, 6]]
+    assert (vectors == (2, 2)).tolist() == [False, True]
+
+
+def test_ambiguous_operand_is_rejected():
+    with pytest.raises(ValueError):
+        VectorArray([[1, 1], [2, 2], [3, 3]]) + np.array([1, 2, 3])
+
+
+def test_in_place_division_of_integer_vectors():
+    vectors = VectorArray.grid(3, 2)
+    vectors /= 2
+    expected = [Vector(x, y) for y in range(2) for x in range(3)]
+    for vector in expected:
+        vector /= 2
+    assert [(v.x, v.y) for v in vectors] == [(v.x, v.y) for v in expected]
+
+    vectors += Vector(1, 2)
+    vectors *= 3
+    assert vectors[5] == Vector((1 + 1) * 3, (0.5 + 2) * 3)
+
+
+def test_neighbours_order():
+    vectors = VectorArray([[0, 0], [3, 7], [-2, 5]])
+    neighbours = vectors.neighbours
+    for i, vector in enumerate(vectors):
+        expected = [[n.x, n.y] for n in vector.neighbours]
+        assert neighbours.data[i * 8:(i + 1) * 8].tolist() == expected
+
+
+def test_neighbour_indices():
+    width, height = 5, 4
+    vectors = VectorArray.grid(width, height)
+    indices = vectors.neighbour_indices(width, height)
+    for i, vector in enumerate(vectors):
+        expected = [
+            n.y * width + n.x if 0 <= n.x < width and 0 <= n.y < height else -1
+            for n in vector.neighbours
+        ]
+        assert indices[i].tolist() == expected
+
+
+def test_perimeters_order():
+    points, counts = RectangleArray.from_rectangles(RECTANGLES).perimeters()
+    assert counts.tolist() == [len(list(rect)) for rect in RECTANGLES]
+
+    start = 0
+    for rect, count in zip(RECTANGLES, counts.tolist()):
+        assert points.data[start:start + count].tolist() == [[p.x, p.y] for p in rect]
+        start += count
+
+
+def scalar_random_points(rect, padding, monkeypatch):
+    """Every point Rectangle.random_point can return, enumerating its random draws."""
+    results = set()
+    for side in range(1, 5):
+        length = rect.width if side in (1, 3) else rect.height
+        for offset in range(length - padding * 2 + 1):
+            draws = iter((side, offset))
+            monkeypatch.setattr(geometry.random, 'randint', lambda a, b: next(draws))
+            point = rect.random_point(padding)
+            results.add((point.x, point.y))
+    monkeypatch.undo()
+    return results
+
+
+@pytest.mark.parametrize('padding', [0, 1])
+def test_random_points_match_random_point(padding, monkeypatch):
+    rectangles = RectangleArray.from_rectangles(RECTANGLES[1:])
+    expected = [scalar_random_points(rect, padding, monkeypatch) for rect in RECTANGLES[1:]]
+
+    rng = np.random.default_rng(0)
+    seen = [set() for _ in expected]
+    for _ in range(500):
+        for i, point in enumerate(rectangles.random_points(padding, rng)):
+            assert (point.x, point.y) in expected[i]
+            seen[i].add((point.x, point.y))
+
+    assert seen == expected
+
+
+def test_overlaps_and_intersection_match_rectangle():
+    pairs = list(itertools.product(RECTANGLES, repeat=2))
+    first = RectangleArray.from_rectangles(pair[0] for pair in pairs)
+    second = RectangleArray.from_rectangles(pair[1] for pair in pairs)
+
+    overlaps = first.overlaps(second)
+    intersections = first.intersection(second)
+    for i, (a, b) in enumerate(pairs):
+        assert overlaps[i] == a.overlaps(b)
+        if overlaps[i]:
+            expected = a.intersection(b)
+            assert intersections.data[i].tolist() == [expected.x1, expected.y1, expected.x2, expected.y2]
+
+    rectangles = RectangleArray.from_rectangles(RECTANGLES)
+    matrix = rectangles.overlap_matrix(rectangles)
+    assert matrix.tolist() == [[a.overlaps(b) for b in RECTANGLES] for a in RECTANGLES]
@@ -0,0 +1,63 @@
+"""Smoke test of the instanced renderer on Mesa's software rasterizer.
+
+pyglet 1.4 needs an X display to create a GL context, machines without one
+(GPU-less CI) have to run the tests under Xvfb, where a missing display is a
+failure rather than a skip::
+
+    LIBGL_ALWAYS_SOFTWARE=1 xvfb-run -a python -m pytest tests
+"""
+import os
+
+import pytest
+
+# Force Mesa's llvmpipe, the renderer has to work without a GPU on CI
+os.environ.setdefault('LIBGL_ALWAYS_SOFTWARE', '1')
+
+pyglet = pytest.importorskip('pyglet')
+np = pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def window():
+    window = pyglet.window.Window(64, 64, visible=False)
+    window.switch_to()
+    yield window
+    window.close()
+
+
+def render(renderer, size=64):
+    from mapcache import Framebuffer
+
+    texture = pyglet.image.Texture.create(size, size)
+    framebuffer = Framebuffer()
+    framebuffer.render(texture, (renderer,))
+    framebuffer.delete()
+    data = texture.get_image_data().get_data('RGBA', size * 4)
+    return np.frombuffer(data, dtype=np.uint8).reshape(size, size, 4)
+
+
+def test_instanced_sprites_are_drawn(window):
+    from instancing import InstancedSpriteRenderer
+
+    atlas = pyglet.image.SolidColorImagePattern((255, 255, 255, 255)).create_image(16, 16).get_texture()
+    frames = pyglet.image.ImageGrid(atlas, rows=1, columns=2)
+    animation = pyglet.image.Animation.from_image_sequence(list(frames), 0.5)
+    renderer = InstancedSpriteRenderer([atlas, animation])
+
+    red = renderer.create_sprite(atlas, 8, 8)
+    red.color = (255, 0, 0)
+    green = renderer.create_sprite(animation, 40, 40)
+    green.color = (0, 255, 0)
+
+    pixels = render(renderer)
+    assert pyglet.gl.glGetError() == pyglet.gl.GL_NO_ERROR
+    # Texture rows go bottom to top like the sprite coordinates
+    assert pixels[12, 12, :3].tolist() == [255, 0, 0]
+    assert pixels[42, 42, :3].tolist() == [0, 255, 0]
+    assert pixels[32, 4, :3].tolist() == [0, 0, 0]
+
+    red.delete()
+    pixels = render(renderer)
+    assert pixels[12, 12, :3].tolist() == [0, 0, 0]
+    assert pixels[42, 42, :3].tolist() == [0, 255, 0]
+    renderer.delete()
@@ -0,0 +1,67 @@
+import base64
+
+import numpy as np
+
+from maploader import MapLoader
+
+
+class RecordingGrid:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.filled = []
+
+    def fill(self, rect, tile_types, seed=None):
+        self.filled.append((rect.x1, rect.y1, rect.x2, rect.y2, tile_types.tolist(), seed))
+
+
+def test_split_orders_chunks_by_distance():
+    grid = RecordingGrid(40, 36)
+    loader = MapLoader(grid)
+    tile_types = np.arange(40 * 36) % 256
+    loader.split(tile_types, 35, 5, chunk_size=16)
+
+    rects = [rect for rect, _ in loader.pending]
+    assert len(rects) == 3 * 3
+    # The chunk holding the origin comes first
+    assert (rects[0].x1, rects[0].y1, rects[0].x2, rects[0].y2) == (32, 0, 39, 15)
+
+    distances = [
+        ((rect.x1 + rect.x2 + 1) / 2 - 35) ** 2 + ((rect.y1 + rect.y2 + 1) / 2 - 5) ** 2
+        for rect in rects
+    ]
+    assert distances == sorted(distances)
+
+    # Every cell is queued exactly once, with its own tile type
+    cells = {}
+    for rect, data in loader.pending:
+        for y in range(rect.y1, rect.y2 + 1):
+            for x in range(rect.x1, rect.x2 + 1):
+                assert (x, y) not in cells
+                cells[x, y] = data[y - rect.y1, x - rect.x1]
+    assert len(cells) == 40 * 36
+    assert all(value == (y * 40 + x) % 256 for (x, y), value in cells.items())
+
+
+def test_decode_accepts_base64_and_lists():
+    tiles = [1, 3, 8, 9, 1, 1]
+    encoded = base64.b64encode(bytes(tiles)).decode()
+    assert MapLoader.decode(encoded).tolist() == tiles
+    assert MapLoader.decode(tiles).tolist() == tiles
+    assert MapLoader.decode(np.array(tiles).reshape(2, 3)).tolist() == tiles
+
+
+def test_process_loads_at_least_one_chunk_and_seeds_by_position():
+    grid = RecordingGrid(32, 16)
+    loader = MapLoader(grid, seed=7, budget=0)
+    loader.push(16, 0, 16, 16, [1] * 256)
+    loader.push(0, 0, 16, 16, [3] * 256)
+
+    loaded = loader.process()
+    assert [(rect.x1, rect.y1) for rect in loaded] == [(16, 0)]
+    assert grid.filled[0][5] == [7, 16, 0]
+
+    loader.process()
+    assert not loader.pending
+    assert grid.filled[1][:4] == (0, 0, 15, 15)
+    assert grid.filled[1][5] == [7, 0, 0]
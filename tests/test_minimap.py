@@ -0,0 +1,65 @@
+"""Minimap rendering checks, these need a GL context like test_instancing."""
+import os
+
+import pytest
+
+os.environ.setdefault('LIBGL_ALWAYS_SOFTWARE', '1')
+
+pyglet = pytest.importorskip('pyglet')
+np = pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def window():
+    window = pyglet.window.Window(64, 64, visible=False)
+    window.switch_to()
+    yield window
+    window.close()
+
+
+def render(batch, size):
+    from mapcache import Framebuffer
+
+    texture = pyglet.image.Texture.create(size, size)
+    framebuffer = Framebuffer()
+    framebuffer.render(texture, (batch,))
+    framebuffer.delete()
+    data = texture.get_image_data().get_data('RGBA', size * 4)
+    return np.frombuffer(data, dtype=np.uint8).reshape(size, size, 4)
+
+
+def test_actor_dots_survive_minification(window):
+    from geometry import Rectangle
+    from minimap import Minimap
+    from palette import Palette
+    from tilegrid import TileGrid
+
+    batch = pyglet.graphics.Batch()
+    grid = TileGrid(1024, 1024)
+    palette = Palette()
+    palette.register(None)
+    minimap = Minimap(grid, palette, 160, batch)
+    minimap.set_position(20, 20)
+    minimap.refresh(Rectangle(0, 0, 1023, 1023))
+    assert minimap.sprite.scale < 1 / 6
+
+    def pixel(pixels, x, y):
+        window_x, window_y = minimap.dot_coords(x, y)
+        return pixels[int(window_y), int(window_x), :3].tolist()
+
+    minimap.move_actor(1, 700, 301, (255, 0, 0))
+    minimap.update()
+    pixels = render(batch, 200)
+    assert pyglet.gl.glGetError() == pyglet.gl.GL_NO_ERROR
+    assert pixel(pixels, 700, 301) == [255, 0, 0]
+
+    minimap.move_actor(1, 701, 302, (255, 0, 0))
+    minimap.move_actor(2, 13, 1000, (0, 255, 0))
+    pixels = render(batch, 200)
+    assert pixel(pixels, 701, 302) == [255, 0, 0]
+    assert pixel(pixels, 13, 1000) == [0, 255, 0]
+
+    minimap.remove_actor(1)
+    pixels = render(batch, 200)
+    assert pixel(pixels, 701, 302) == [0, 0, 0]
+    minimap.delete()
@@ -0,0 +1,61 @@
+import numpy as np
+
+from palette import Palette
+
+
+def test_register_deduplicates_specs():
+    palette = Palette()
+    offset, size = palette.register({'h': [20, 30], 's': 70, 'v': 28})
+    assert (offset, size) == (0, 4)
+
+    # Same ranges in another order and as a tuple map to the same colors
+    assert palette.register({'v': 28, 'h': (20, 30), 's': 70}) == (offset, size)
+    assert len(palette.colors) == size
+
+    assert palette.register({'h': 30, 's': 40, 'v': 27}) == (size, 1)
+    assert len(palette.colors) == size + 1
+
+
+def test_default_color_is_white():
+    palette = Palette()
+    assert palette.register(None) == palette.register({}) == (0, 1)
+    assert palette[0] == (255, 255, 255)
+
+
+def test_ranges_are_quantized():
+    palette = Palette(steps=4)
+    _, size = palette.register({'h': [0, 360], 's': [0, 100], 'v': 100})
+    assert size == 4 * 4
+
+    # Narrow ranges give fewer values than steps
+    _, size = palette.register({'h': [10, 11], 's': 50, 'v': 50})
+    assert size == 2
+
+
+def test_pick_stays_within_the_spec():
+    palette = Palette()
+    palette.register({'h': 0, 's': 0, 'v': 0})
+    spec = {'h': [100, 140], 's': [50, 60], 'v': 80}
+    offset, size = palette.register(spec)
+
+    picked = palette.pick(spec, 500, np.random.default_rng(1))
+    assert picked.dtype == np.uint16
+    assert picked.min() >= offset and picked.max() < offset + size
+    assert len(np.unique(picked)) == size
+
+
+def test_from_tileset_registers_every_layer():
+    tileset = {
+        'grass': [
+            {'color': {'background': {'h': [90, 120], 's': 60, 'v': 40}}},
+            {'color': {'background': {'h': [90, 120], 's': 60, 'v': 40}, 'foreground': {'h': 100}}},
+        ],
+        'rock': [{}],
+    }
+    palette = Palette.from_tileset(tileset)
+    count = len(palette.colors)
+    for manifests in tileset.values():
+        for manifest in manifests:
+            for layer in ('background', 'foreground'):
+                palette.register(Palette.layer_color(manifest, layer))
+    assert len(palette.colors) == count
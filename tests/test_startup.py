@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFERRED = (
+    'numpy', 'yaml', 'aiohttp', 'geometry', 'gameutil', 'instancing', 'palette', 'mapcache',
+    'maploader', 'tilegrid', 'minimap'
+)
+
+
+def imported_after(code):
+    """Modules from DEFERRED loaded after running code in a fresh interpreter."""
+    output = subprocess.check_output(
+        [sys.executable, '-c', code + f'\nimport sys\nprint(",".join(m for m in {DEFERRED!r} if m in sys.modules))'],
+        cwd=ROOT
+    )
+    return [name for name in output.decode().strip().split(',') if name]
+
+
+def test_first_frame_path_skips_heavy_imports():
+    pytest.importorskip('pyglet')
+    # No shadow window, this only checks imports and may run without a display
+    code = 'import pyglet\npyglet.options["shadow_window"] = False\nimport app'
+    assert imported_after(code) == []
+
+
+def test_geometry_imports_numpy_on_first_array_use():
+    code = 'from geometry import Vector, Rectangle\nlist(Rectangle(0, 0, 2, 2))\nVector(1, 2).normalized'
+    assert imported_after(code) == ['geometry']
+
+    assert 'numpy' in imported_after('from geometry import VectorArray\nVectorArray.grid(2, 2)')
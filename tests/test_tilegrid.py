@@ -0,0 +1,120 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pyglet')
+yaml = pytest.importorskip('yaml')
+
+from geometry import Rectangle  # noqa: E402
+from gameutil import Tile, GameResources  # noqa: E402
+from maploader import MapLoader  # noqa: E402
+from palette import Palette  # noqa: E402
+from tilegrid import TileGrid, NO_LAYER  # noqa: E402
+
+TILESET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'tileset.yml')
+CODES = (1, 3, 8, 9)
+
+
+@pytest.fixture(autouse=True)
+def tileset(monkeypatch):
+    """The tileset manifests and palette, without loading any image."""
+    with open(TILESET, 'rt') as file:
+        grouped = {}
+        for tile in yaml.load_all(file, yaml.FullLoader):
+            grouped.setdefault(tile['tile'], []).append(GameResources.process_tile_manifest(tile))
+
+    monkeypatch.setattr(GameResources, 'data', {'tileset': {'manifest': grouped}})
+    monkeypatch.setattr(GameResources, 'palette', Palette.from_tileset(grouped))
+    return grouped
+
+
+def random_map(width, height, seed=0):
+    return np.random.default_rng(seed).choice(CODES, size=width * height).astype(np.uint8)
+
+
+def load(tile_types, width, height, origin, seed=7):
+    grid = TileGrid(width, height)
+    loader = MapLoader(grid, seed)
+    loader.split(tile_types, *origin)
+    while loader.pending:
+        loader.process()
+    return grid
+
+
+ARRAYS = ('types', 'manifests', 'backgrounds', 'foregrounds', 'background_colors', 'foreground_colors')
+
+
+def test_seeded_fill_does_not_depend_on_chunk_order():
+    width, height = 40, 40
+    tile_types = random_map(width, height)
+    first = load(tile_types, width, height, (0, 0))
+    second = load(tile_types, width, height, (39, 39))
+
+    for name in ARRAYS:
+        assert np.array_equal(getattr(first, name), getattr(second, name)), name
+
+    other_seed = load(tile_types, width, height, (0, 0), seed=8)
+    assert not np.array_equal(first.backgrounds, other_seed.backgrounds)
+
+
+def test_fill_picks_valid_layers_and_colors(tileset):
+    width, height = 32, 32
+    grid = load(random_map(width, height, 3), width, height, (0, 0))
+    assert grid.types.tolist() == random_map(width, height, 3).tolist()
+
+    palette = GameResources.palette
+    for index in range(width * height):
+        manifest = tileset[Tile.Type(int(grid.types[index])).name][grid.manifests[index]]
+        for layer, variants, colors in (
+            ('background', grid.backgrounds, grid.background_colors),
+            ('foreground', grid.foregrounds, grid.foreground_colors)
+        ):
+            coords = Tile.layer_coords(manifest, layer)
+            if variants[index] == NO_LAYER:
+                # Only manifests with empty variants or no layer at all leave it out
+                assert not coords or None in coords
+                continue
+            assert coords[variants[index]] is not None
+            offset, size = palette.register(Palette.layer_color(manifest, layer))
+            assert offset <= colors[index] < offset + size
+
+
+def test_foreground_mask_round_trips():
+    width, height = 13, 7
+    grid = TileGrid(width, height)
+    assert all(grid.foreground_visible(x, y) for y in range(height) for x in range(width))
+
+    rng = np.random.default_rng(5)
+    hidden = {(int(x), int(y)) for x, y in zip(rng.integers(0, width, 30), rng.integers(0, height, 30))}
+    for x, y in hidden:
+        grid.set_foreground_visible(x, y, False)
+    # Hiding twice must not flip the bit back
+    x, y = next(iter(hidden))
+    grid.set_foreground_visible(x, y, False)
+
+    expected = np.array([(x, y) not in hidden for y in range(height) for x in range(width)])
+    for y in range(height):
+        for x in range(width):
+            assert grid.foreground_visible(x, y) == expected[grid.index(x, y)]
+    index = np.arange(width * height)
+    assert grid.foreground_visibility(index).tolist() == expected.tolist()
+    assert grid.foreground_visibility(index[::3]).tolist() == expected[::3].tolist()
+
+    for x, y in hidden:
+        grid.set_foreground_visible(x, y, True)
+    assert grid.foreground_visibility(index).all()
+    assert grid.foreground_mask.tolist() == [0xFF] * len(grid.foreground_mask)
+
+
+def test_loaded_and_has_foreground():
+    grid = TileGrid(16, 16)
+    assert not grid.loaded(3, 3)
+    assert not grid.has_foreground(3, 3)
+
+    grid.fill(Rectangle(0, 0, 15, 15), random_map(16, 16, 4), seed=[1, 0, 0])
+    index = np.arange(16 * 16)
+    for position in index.tolist():
+        y, x = divmod(position, 16)
+        assert grid.loaded(x, y)
+        assert grid.has_foreground(x, y) == (grid.foregrounds[position] != NO_LAYER)
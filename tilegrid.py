@@ -0,0 +1,120 @@
+import numpy as np
+
+from palette import Palette
+from gameutil import Tile, GameResources
+
+NO_LAYER = 255
+
+
+class TileGrid:
+    """Compact map model with one entry per cell in typed arrays.
+
+    ``types`` holds Tile.Type codes (0 for cells that are not loaded yet),
+    ``manifests`` the manifest picked among the ones of the tile type, the
+    layer arrays the image variant of each layer (NO_LAYER when there is
+    none) and the color arrays palette indices. ``foreground_mask`` is a
+    bitmask of the foregrounds currently shown. Sprites are derived from
+    this data only when chunks are rendered.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.types = np.zeros(size, dtype=np.uint8)
+        self.manifests = np.zeros(size, dtype=np.uint8)
+        self.backgrounds = np.full(size, NO_LAYER, dtype=np.uint8)
+        self.foregrounds = np.full(size, NO_LAYER, dtype=np.uint8)
+        self.background_colors = np.zeros(size, dtype=np.uint16)
+        self.foreground_colors = np.zeros(size, dtype=np.uint16)
+        self.foreground_mask = np.full((size + 7) // 8, 0xFF, dtype=np.uint8)
+        self._images = {}
+
+    def index(self, x, y):
+        return y * self.width + x
+
+    def region(self, rect):
+        """Flat indices of the cells of a tile rectangle, row by row."""
+        xs = np.arange(rect.x1, rect.x2 + 1)
+        ys = np.arange(rect.y1, rect.y2 + 1)
+        return (ys[:, np.newaxis] * self.width + xs).ravel()
+
+    def fill(self, rect, tile_types, seed=None):
+        """Set the tile types of a rectangle, picking variants and colors in bulk for each manifest."""
+        rng = np.random.default_rng(seed)
+        index = self.region(rect)
+        codes = np.asarray(tile_types, dtype=np.uint8).ravel()
+        self.types[index] = codes
+
+        manifests = GameResources.data['tileset']['manifest']
+        palette = GameResources.palette
+        for code in np.unique(codes).tolist():
+            positions = index[codes == code]
+            variants = manifests[Tile.Type(code).name]
+            choices = rng.integers(0, len(variants), size=len(positions))
+            self.manifests[positions] = choices
+
+            for manifest_index, manifest in enumerate(variants):
+                selected = positions[choices == manifest_index]
+                for layer, layers, colors in (
+                    ('background', self.backgrounds, self.background_colors),
+                    ('foreground', self.foregrounds, self.foreground_colors)
+                ):
+                    coords = Tile.layer_coords(manifest, layer)
+                    if not coords:
+                        layers[selected] = NO_LAYER
+                        continue
+
+                    empty = np.array([not variant for variant in coords])
+                    picked = rng.integers(0, len(coords), size=len(selected))
+                    layers[selected] = np.where(empty[picked], NO_LAYER, picked)
+                    colors[selected] = palette.pick(Palette.layer_color(manifest, layer), len(selected), rng)
+
+    def loaded(self, x, y):
+        return self.types[self.index(x, y)] != 0
+
+    def has_foreground(self, x, y):
+        index = self.index(x, y)
+        return self.types[index] != 0 and self.foregrounds[index] != NO_LAYER
+
+    def foreground_visible(self, x, y):
+        index = self.index(x, y)
+        return bool(self.foreground_mask[index >> 3] & (1 << (index & 7)))
+
+    def set_foreground_visible(self, x, y, visible):
+        index = self.index(x, y)
+        if visible:
+            self.foreground_mask[index >> 3] |= 1 << (index & 7)
+        else:
+            self.foreground_mask[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def foreground_visibility(self, index):
+        """Foreground visibility bits of the given cells as a boolean array."""
+        return (self.foreground_mask[index >> 3] >> (index & 7) & 1).astype(bool)
+
+    def _layer_images(self, code, manifest_index, layer):
+        key = (code, manifest_index, layer)
+        if key not in self._images:
+            manifest = GameResources.data['tileset']['manifest'][Tile.Type(code).name][manifest_index]
+            images = GameResources.data['tileset'][layer]
+            self._images[key] = [
+                images[coords[1], coords[0]] if coords else None
+                for coords in Tile.layer_coords(manifest, layer)
+            ]
+        return self._images[key]
+
+    def layer(self, index, layer):
+        """Tile.Layer to draw for one cell, or None."""
+        code = int(self.types[index])
+        if code == 0:
+            return None
+
+        if layer == 'background':
+            variant, color_index = self.backgrounds[index], self.background_colors[index]
+        else:
+            variant, color_index = self.foregrounds[index], self.foreground_colors[index]
+        if variant == NO_LAYER:
+            return None
+
+        image = self._layer_images(code, int(self.manifests[index]), layer)[variant]
+        return Tile.Layer(image, int(color_index))